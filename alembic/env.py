@@ -25,8 +25,13 @@ target_metadata = Base.metadata
 
 
 def include_object(object, name, type_, reflected, compare_to):
-    # ejemplo: no tocar tabla telemetry si la tienes fuera de SQLAlchemy
-    if type_ == "table" and name == "telemetry":
+    # telemetry (y sus particiones telemetry_yYYYYmMM) se gestiona con migraciones
+    # escritas a mano: el autogenerate no sabe de particionado, así que no la tocamos
+    if type_ == "table" and (name == "telemetry" or name.startswith("telemetry_")):
+        return False
+    # etag_versions (migración b6d4e8a2c913) tampoco tiene modelo: solo la usan
+    # app/etags.py y un trigger de telemetry
+    if type_ == "table" and name == "etag_versions":
         return False
     return True
 
@@ -0,0 +1,137 @@
+"""partition telemetry by month on ts_utc
+
+Revision ID: 7b2e4c9d1a36
+Revises: 1c12e97e2a35
+Create Date: 2026-10-17 10:12:41.503118
+
+Mete la tabla `telemetry` bajo Alembic como tabla particionada por rangos
+mensuales de `ts_utc`. Si ya existe (la de siempre, fuera de Alembic), se
+renombra a `telemetry_legacy`, se crean las particiones que cubren sus datos
+y se copian las filas. `telemetry_legacy` se queda ahí hasta que se borre a
+mano, una vez comprobado que todo cuadra.
+
+Las particiones futuras las crea `manage_partitions.py` (cron diario).
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2e4c9d1a36'
+down_revision: Union[str, Sequence[str], None] = '1c12e97e2a35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# meses por delante que dejamos creados al migrar
+MONTHS_AHEAD = 3
+
+
+def _next_month(d: date) -> date:
+    return date(d.year + 1, 1, 1) if d.month == 12 else date(d.year, d.month + 1, 1)
+
+
+def _create_partition(month: date) -> None:
+    op.execute(
+        f"CREATE TABLE IF NOT EXISTS telemetry_y{month.year:04d}m{month.month:02d} "
+        f"PARTITION OF telemetry "
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+        f"TO ('{_next_month(month).isoformat()} 00:00:00+00')"
+    )
+
+
+def _legacy_is_naive(bind) -> bool:
+    """¿telemetry_legacy.ts_utc es timestamp sin zona (guardado en UTC)?"""
+    return bind.execute(
+        sa.text(
+            """
+            SELECT data_type = 'timestamp without time zone'
+            FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND table_name = 'telemetry_legacy' AND column_name = 'ts_utc'
+            """
+        )
+    ).scalar()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    has_legacy = sa.inspect(bind).has_table("telemetry")
+
+    first_month = datetime.now(timezone.utc).date().replace(day=1)
+    if has_legacy:
+        op.execute("ALTER TABLE telemetry RENAME TO telemetry_legacy")
+        # si la columna vieja no tiene zona, sus valores son UTC: se convierten
+        # con AT TIME ZONE 'UTC' y no con la zona de la sesión (el cast implícito)
+        legacy_ts = "ts_utc AT TIME ZONE 'UTC'" if _legacy_is_naive(bind) else "ts_utc"
+        # el mes en UTC, que es como van las particiones
+        oldest = bind.execute(sa.text(f"SELECT min({legacy_ts}) FROM telemetry_legacy")).scalar()
+        if oldest is not None:
+            first_month = min(first_month, oldest.astimezone(timezone.utc).date().replace(day=1))
+
+    op.execute(
+        """
+        CREATE TABLE telemetry (
+            id BIGSERIAL NOT NULL,
+            device_key VARCHAR(100) NOT NULL,
+            ts_utc TIMESTAMPTZ NOT NULL,
+            temp DOUBLE PRECISION,
+            hum DOUBLE PRECISION,
+            co2 INTEGER,
+            nh3 INTEGER,
+            PRIMARY KEY (id, ts_utc)
+        ) PARTITION BY RANGE (ts_utc)
+        """
+    )
+
+    # particiones desde el dato más antiguo hasta MONTHS_AHEAD meses por delante
+    last_month = datetime.now(timezone.utc).date().replace(day=1)
+    for _ in range(MONTHS_AHEAD):
+        last_month = _next_month(last_month)
+    month = first_month
+    while month <= last_month:
+        _create_partition(month)
+        month = _next_month(month)
+
+    # índice en la tabla padre: Postgres lo replica en cada partición
+    op.execute(
+        "CREATE INDEX ix_telemetry_device_key_ts_utc ON telemetry (device_key, ts_utc DESC)"
+    )
+
+    if has_legacy:
+        op.execute(
+            f"""
+            INSERT INTO telemetry (id, device_key, ts_utc, temp, hum, co2, nh3)
+            SELECT id, device_key, {legacy_ts}, temp, hum, co2, nh3
+            FROM telemetry_legacy
+            WHERE ts_utc IS NOT NULL AND device_key IS NOT NULL
+            """
+        )
+        op.execute(
+            "SELECT setval(pg_get_serial_sequence('telemetry', 'id'), "
+            "COALESCE((SELECT max(id) FROM telemetry), 0) + 1, false)"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if sa.inspect(bind).has_table("telemetry_legacy"):
+        # devolvemos a la tabla vieja lo que haya entrado después de migrar
+        # (en UTC si su columna no tiene zona)
+        ts = "ts_utc AT TIME ZONE 'UTC'" if _legacy_is_naive(bind) else "ts_utc"
+        op.execute(
+            f"""
+            INSERT INTO telemetry_legacy (id, device_key, ts_utc, temp, hum, co2, nh3)
+            SELECT id, device_key, {ts}, temp, hum, co2, nh3
+            FROM telemetry
+            WHERE id > (SELECT COALESCE(max(id), 0) FROM telemetry_legacy)
+            """
+        )
+        op.execute("DROP TABLE telemetry")
+        op.execute("ALTER TABLE telemetry_legacy RENAME TO telemetry")
+    else:
+        op.execute("DROP TABLE telemetry")
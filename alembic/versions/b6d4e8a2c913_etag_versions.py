@@ -0,0 +1,77 @@
+"""per-user versions for ETags
+
+Revision ID: b6d4e8a2c913
+Revises: f3b8d2a61c57
+Create Date: 2026-10-17 18:20:44.318027
+
+Tabla `etag_versions` con dos contadores por usuario, para que comprobar una
+ETag (app/etags.py) sea leer una fila por clave primaria:
+
+- hierarchy_version: lo suben los create_* de granjas, naves y dispositivos,
+  en la misma transacción que el alta.
+- telemetry_version: lo sube un trigger por sentencia sobre `telemetry`
+  (como los de rollups y notify) a los dueños de los dispositivos de las
+  filas insertadas, entre por donde entre la lectura. Las granjas sin dueño
+  (owner_user_id a NULL al borrar el usuario) no suben nada.
+
+Un usuario sin fila tiene las dos versiones a 0.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6d4e8a2c913'
+down_revision: Union[str, Sequence[str], None] = 'f3b8d2a61c57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        """
+        CREATE TABLE etag_versions (
+            user_id INTEGER PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE,
+            hierarchy_version BIGINT NOT NULL DEFAULT 0,
+            telemetry_version BIGINT NOT NULL DEFAULT 0
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE FUNCTION telemetry_etag_ins() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO etag_versions AS v (user_id, telemetry_version)
+            SELECT DISTINCT f.owner_user_id, 1
+            FROM new_rows n
+            JOIN devices d ON d.device_key = n.device_key
+            JOIN sheds s ON s.id = d.shed_id
+            JOIN farms f ON f.id = s.farm_id
+            WHERE f.owner_user_id IS NOT NULL
+            -- siempre en el mismo orden: dos ingestas a la vez bloquean las
+            -- filas de etag_versions igual y se esperan en vez de cruzarse
+            ORDER BY f.owner_user_id
+            ON CONFLICT (user_id) DO UPDATE SET telemetry_version = v.telemetry_version + 1;
+            RETURN NULL;
+        END
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER telemetry_etag_ins
+        AFTER INSERT ON telemetry
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION telemetry_etag_ins()
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS telemetry_etag_ins ON telemetry")
+    op.execute("DROP FUNCTION IF EXISTS telemetry_etag_ins()")
+    op.execute("DROP TABLE etag_versions")
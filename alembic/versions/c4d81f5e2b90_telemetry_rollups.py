@@ -0,0 +1,131 @@
+"""telemetry hourly/daily rollups
+
+Revision ID: c4d81f5e2b90
+Revises: 7b2e4c9d1a36
+Create Date: 2026-10-17 11:02:17.880412
+
+Tablas `telemetry_1h` y `telemetry_1d` con sum/count/min/max/last por métrica,
+claves (device_key, bucket). Se mantienen de forma incremental con un trigger
+por sentencia sobre `telemetry` (tabla de transición `new_rows`), así que da
+igual quién inserte: el /telemetry/batch, un COPY o el canal de fuera.
+
+Solo se siguen los INSERT: desenganchar o borrar particiones viejas NO toca
+los rollups, que es justo lo que queremos para el histórico largo.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d81f5e2b90'
+down_revision: Union[str, Sequence[str], None] = '7b2e4c9d1a36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+METRICS = ("temp", "hum", "co2", "nh3")
+ROLLUPS = {"telemetry_1h": "hour", "telemetry_1d": "day"}
+
+
+def _create_table(table: str) -> None:
+    cols = []
+    for m in METRICS:
+        cols += [
+            f"{m}_sum DOUBLE PRECISION NOT NULL DEFAULT 0",
+            f"{m}_count BIGINT NOT NULL DEFAULT 0",
+            f"{m}_min DOUBLE PRECISION",
+            f"{m}_max DOUBLE PRECISION",
+            f"{m}_last DOUBLE PRECISION",
+            f"{m}_last_ts TIMESTAMPTZ",
+        ]
+    op.execute(
+        f"""
+        CREATE TABLE {table} (
+            device_key VARCHAR(100) NOT NULL,
+            bucket TIMESTAMPTZ NOT NULL,
+            n BIGINT NOT NULL DEFAULT 0,
+            {", ".join(cols)},
+            PRIMARY KEY (device_key, bucket)
+        )
+        """
+    )
+
+
+def _upsert_sql(table: str, unit: str, source: str) -> str:
+    """INSERT ... SELECT agrupado desde `source` que suma a lo que ya haya en `table`."""
+    # buckets siempre en UTC, independientemente del TimeZone de la sesión
+    bucket = f"date_trunc('{unit}', ts_utc AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'"
+
+    insert_cols = ["device_key", "bucket", "n"]
+    select_cols = ["device_key", bucket, "count(*)"]
+    updates = ["n = t.n + EXCLUDED.n"]
+    for m in METRICS:
+        insert_cols += [f"{m}_sum", f"{m}_count", f"{m}_min", f"{m}_max", f"{m}_last", f"{m}_last_ts"]
+        select_cols += [
+            f"COALESCE(sum({m}), 0)",
+            f"count({m})",
+            f"min({m})",
+            f"max({m})",
+            f"(array_agg({m} ORDER BY ts_utc DESC) FILTER (WHERE {m} IS NOT NULL))[1]",
+            f"max(ts_utc) FILTER (WHERE {m} IS NOT NULL)",
+        ]
+        newer = (
+            f"EXCLUDED.{m}_last_ts IS NOT NULL "
+            f"AND (t.{m}_last_ts IS NULL OR EXCLUDED.{m}_last_ts >= t.{m}_last_ts)"
+        )
+        updates += [
+            f"{m}_sum = t.{m}_sum + EXCLUDED.{m}_sum",
+            f"{m}_count = t.{m}_count + EXCLUDED.{m}_count",
+            f"{m}_min = LEAST(t.{m}_min, EXCLUDED.{m}_min)",
+            f"{m}_max = GREATEST(t.{m}_max, EXCLUDED.{m}_max)",
+            f"{m}_last = CASE WHEN {newer} THEN EXCLUDED.{m}_last ELSE t.{m}_last END",
+            f"{m}_last_ts = GREATEST(t.{m}_last_ts, EXCLUDED.{m}_last_ts)",
+        ]
+
+    return f"""
+        INSERT INTO {table} AS t ({", ".join(insert_cols)})
+        SELECT {", ".join(select_cols)}
+        FROM {source}
+        GROUP BY 1, 2
+        ON CONFLICT (device_key, bucket) DO UPDATE SET
+            {", ".join(updates)}
+    """
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in ROLLUPS:
+        _create_table(table)
+
+    body = ";\n".join(_upsert_sql(table, unit, "new_rows") for table, unit in ROLLUPS.items())
+    op.execute(
+        f"""
+        CREATE FUNCTION telemetry_rollup_ins() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            {body};
+            RETURN NULL;
+        END
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER telemetry_rollup_ins
+        AFTER INSERT ON telemetry
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION telemetry_rollup_ins()
+        """
+    )
+
+    # relleno inicial con lo que ya hay en telemetry
+    for table, unit in ROLLUPS.items():
+        op.execute(_upsert_sql(table, unit, "telemetry"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS telemetry_rollup_ins ON telemetry")
+    op.execute("DROP FUNCTION IF EXISTS telemetry_rollup_ins()")
+    for table in ROLLUPS:
+        op.execute(f"DROP TABLE {table}")
@@ -0,0 +1,53 @@
+"""notify new telemetry rows
+
+Revision ID: d9a3b6e17f42
+Revises: c4d81f5e2b90
+Create Date: 2026-10-17 11:48:03.114529
+
+Trigger por sentencia que hace pg_notify('telemetry', <fila en JSON>) por cada
+lectura insertada. Lo escucha el hub de app/live.py (una conexión LISTEN por
+worker) para empujar los datos por /telemetry/stream.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9a3b6e17f42'
+down_revision: Union[str, Sequence[str], None] = 'c4d81f5e2b90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        """
+        CREATE FUNCTION telemetry_notify() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            r record;
+        BEGIN
+            FOR r IN SELECT id, device_key, ts_utc, temp, hum, co2, nh3 FROM new_rows LOOP
+                PERFORM pg_notify('telemetry', row_to_json(r)::text);
+            END LOOP;
+            RETURN NULL;
+        END
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER telemetry_notify
+        AFTER INSERT ON telemetry
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION telemetry_notify()
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS telemetry_notify ON telemetry")
+    op.execute("DROP FUNCTION IF EXISTS telemetry_notify()")
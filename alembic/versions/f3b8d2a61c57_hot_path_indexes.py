@@ -0,0 +1,160 @@
+"""indexes for ownership and telemetry hot paths
+
+Revision ID: f3b8d2a61c57
+Revises: d9a3b6e17f42
+Create Date: 2026-10-17 13:05:27.640219
+
+Índices para los filtros calientes, todos con CREATE INDEX CONCURRENTLY para
+poder lanzarla en caliente sin bloquear escrituras:
+
+- farms(owner_user_id), sheds(farm_id) y devices(shed_id), con INCLUDE de las
+  columnas que lee el índice de propiedad (app/ownership.py), que así sale
+  con index-only scans.
+- telemetry(device_key, ts_utc DESC, id DESC) INCLUDE (temp, hum, co2, nh3),
+  que sustituye a ix_telemetry_device_key_ts_utc. "Última lectura", los rangos
+  y la paginación por cursor de /telemetry/ (ORDER BY ts_utc DESC, id DESC) se
+  responden desde el índice, ya ordenados y sin ir a la tabla.
+
+En una tabla particionada no se puede usar CONCURRENTLY sobre el padre. Se
+crea el índice ON ONLY telemetry (queda inválido), luego el de cada partición
+en concurrente, y se van enganchando con ATTACH PARTITION. Cuando está la
+última, el del padre pasa a válido. Las particiones nuevas lo heredan solas.
+
+Unicidad de (device_key, ts_utc) opcional: se añade además el índice único
+ux_telemetry_device_key_ts_utc con
+
+    alembic -x telemetry_unique=true upgrade head
+
+Si ya hay duplicados, la migración se para antes de tocar nada. Con el
+índice único, POST /telemetry/batch se salta las lecturas repetidas (ON
+CONFLICT DO NOTHING desde su tabla temporal) y las devuelve en `rejected`.
+
+Para ver qué queries usan los índices: python check_indexes.py
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b8d2a61c57'
+down_revision: Union[str, Sequence[str], None] = 'd9a3b6e17f42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TELEMETRY_COVERING = "(device_key, ts_utc DESC, id DESC) INCLUDE (temp, hum, co2, nh3)"
+TELEMETRY_UNIQUE = "(device_key, ts_utc)"
+TELEMETRY_OLD = "(device_key, ts_utc DESC)"
+
+
+def _telemetry_partitions() -> list[str]:
+    """
+    Todas las particiones enganchadas a telemetry. Aquí y no con
+    app.partitions: la migración no debe cargar la app (ni su logger).
+    """
+    rows = op.get_bind().execute(
+        sa.text(
+            """
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = 'telemetry'
+            ORDER BY c.relname
+            """
+        )
+    ).fetchall()
+    return [name for (name,) in rows]
+
+
+def _telemetry_unique() -> bool:
+    return context.get_x_argument(as_dictionary=True).get("telemetry_unique", "").lower() in (
+        "1",
+        "true",
+        "yes",
+    )
+
+
+def _drop_if_invalid(name: str) -> None:
+    """Un CREATE INDEX CONCURRENTLY que falla deja el índice a medias (INVALID)."""
+    invalid = op.get_bind().execute(
+        sa.text(
+            """
+            SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = :name AND NOT i.indisvalid
+            """
+        ),
+        {"name": name},
+    ).scalar()
+    if invalid:
+        op.execute(f"DROP INDEX CONCURRENTLY {name}")
+
+
+def _create_telemetry_index(name: str, suffix: str, columns: str, unique: bool = False) -> None:
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    op.execute(f"CREATE {kind} IF NOT EXISTS {name} ON ONLY telemetry {columns}")
+    for part in _telemetry_partitions():
+        part_index = f"{part}_{suffix}"
+        _drop_if_invalid(part_index)
+        op.execute(f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {part_index} ON {part} {columns}")
+        op.execute(f"ALTER INDEX {name} ATTACH PARTITION {part_index}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    unique = _telemetry_unique()
+    if unique:
+        dupes = op.get_bind().execute(
+            sa.text(
+                """
+                SELECT count(*) FROM (
+                    SELECT 1 FROM telemetry GROUP BY device_key, ts_utc HAVING count(*) > 1
+                ) d
+                """
+            )
+        ).scalar()
+        if dupes:
+            raise RuntimeError(
+                f"telemetry has {dupes} duplicated (device_key, ts_utc) pairs; "
+                "clean them up before running with -x telemetry_unique=true"
+            )
+
+    with op.get_context().autocommit_block():
+        for name, table, column, include in (
+            ("ix_farms_owner_user_id", "farms", "owner_user_id", ["id"]),
+            ("ix_sheds_farm_id", "sheds", "farm_id", ["id"]),
+            ("ix_devices_shed_id", "devices", "shed_id", ["id", "device_key"]),
+        ):
+            _drop_if_invalid(name)
+            op.create_index(
+                name,
+                table,
+                [column],
+                postgresql_include=include,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+        _create_telemetry_index("ix_telemetry_device_key_ts_utc_cov", "dk_ts_cov", TELEMETRY_COVERING)
+        if unique:
+            _create_telemetry_index(
+                "ux_telemetry_device_key_ts_utc", "dk_ts_uq", TELEMETRY_UNIQUE, unique=True
+            )
+        # el de la migración de particionado queda cubierto por el nuevo
+        op.execute("DROP INDEX IF EXISTS ix_telemetry_device_key_ts_utc")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        _create_telemetry_index("ix_telemetry_device_key_ts_utc", "device_key_ts_utc_idx", TELEMETRY_OLD)
+        op.execute("DROP INDEX IF EXISTS ux_telemetry_device_key_ts_utc")
+        op.execute("DROP INDEX IF EXISTS ix_telemetry_device_key_ts_utc_cov")
+
+        for name, table in (
+            ("ix_devices_shed_id", "devices"),
+            ("ix_sheds_farm_id", "sheds"),
+            ("ix_farms_owner_user_id", "farms"),
+        ):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
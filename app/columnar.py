@@ -0,0 +1,128 @@
+# app/columnar.py
+"""
+Respuestas por columnas para gráficas: en vez de una lista de objetos JSON se
+devuelve cada métrica como un array empaquetado. Se pide con la cabecera Accept:
+
+- application/vnd.apache.arrow.stream → Arrow IPC (stream) con tipos y nulos
+  de verdad. Se lee con apache-arrow en JS o con pyarrow.
+- application/x-msgpack → MessagePack con
+  {"n": N, "dtype": "<f8", "columns": {nombre: bytes}}. Cada columna es un
+  array de float64 little-endian (en JS, `new Float64Array(bytes.buffer)`).
+  Los nulos van como NaN y las fechas como segundos epoch.
+
+pyarrow y msgpack son opcionales. Si falta el del formato pedido, se responde
+JSON como siempre.
+"""
+from __future__ import annotations
+
+import math
+import sys
+from array import array
+from typing import Iterable, Sequence
+
+from fastapi import Response
+
+try:
+    import pyarrow as pa
+except ImportError:  # dependencia opcional
+    pa = None
+
+try:
+    import msgpack
+except ImportError:  # dependencia opcional
+    msgpack = None
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+_MSGPACK_ALIASES = {MSGPACK_MEDIA_TYPE, "application/msgpack", "application/vnd.msgpack"}
+
+TIME_COLUMNS = {"ts_utc", "bucket"}
+INT_COLUMNS = {"id", "count", "co2", "nh3"}
+
+
+def negotiate(accept: str | None) -> str | None:
+    """Formato por columnas que pide el Accept (y que podemos servir), o None para JSON."""
+    if not accept:
+        return None
+    wanted: list[tuple[float, str]] = []
+    for part in accept.split(","):
+        media_type, *params = (p.strip() for p in part.split(";"))
+        q = 1.0
+        for p in params:
+            if p.startswith("q="):
+                try:
+                    q = float(p[2:])
+                except ValueError:
+                    q = 0.0
+        wanted.append((q, media_type.lower()))
+
+    json_q = max((q for q, mt in wanted if mt in ("application/json", "*/*")), default=0.0)
+    for q, media_type in sorted(wanted, key=lambda w: -w[0]):
+        if q <= 0 or q < json_q:
+            break
+        if media_type == ARROW_MEDIA_TYPE and pa is not None:
+            return ARROW_MEDIA_TYPE
+        if media_type in _MSGPACK_ALIASES and msgpack is not None:
+            return MSGPACK_MEDIA_TYPE
+    return None
+
+
+def rows_to_columns(rows: Sequence, names: Iterable[str]) -> dict[str, Sequence]:
+    """Transpone filas de SQLAlchemy (Row) a {columna: valores}, sin pasar por dicts."""
+    names = list(names)
+    if not rows:
+        return {n: () for n in names}
+    fields = rows[0]._fields
+    transposed = list(zip(*rows))
+    return {n: transposed[fields.index(n)] for n in names}
+
+
+def dicts_to_columns(items: Sequence[dict], names: Iterable[str]) -> dict[str, Sequence]:
+    return {n: [item[n] for item in items] for n in names}
+
+
+def _kind(name: str) -> str:
+    if name in TIME_COLUMNS:
+        return "time"
+    if name in INT_COLUMNS or name.endswith("_count"):
+        return "int"
+    return "float"
+
+
+def _arrow_body(columns: dict[str, Sequence]) -> bytes:
+    types = {
+        "time": pa.timestamp("us", tz="UTC"),
+        "int": pa.int64(),
+        "float": pa.float64(),
+    }
+    batch = pa.RecordBatch.from_arrays(
+        [pa.array(values, type=types[_kind(name)]) for name, values in columns.items()],
+        names=list(columns),
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def _msgpack_body(columns: dict[str, Sequence]) -> bytes:
+    packed: dict[str, bytes] = {}
+    n = 0
+    for name, values in columns.items():
+        if _kind(name) == "time":
+            values = [v.timestamp() if v is not None else None for v in values]
+        arr = array("d", (math.nan if v is None else v for v in values))
+        if sys.byteorder == "big":
+            arr.byteswap()
+        packed[name] = arr.tobytes()
+        n = len(arr)
+    return msgpack.packb({"n": n, "dtype": "<f8", "columns": packed})
+
+
+def columnar_response(
+    media_type: str,
+    columns: dict[str, Sequence],
+    headers: dict[str, str] | None = None,
+) -> Response:
+    body = _arrow_body(columns) if media_type == ARROW_MEDIA_TYPE else _msgpack_body(columns)
+    return Response(content=body, media_type=media_type, headers={**(headers or {}), "Vary": "Accept"})
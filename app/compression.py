@@ -0,0 +1,154 @@
+# app/compression.py
+"""
+Compresión gzip / brotli de respuestas (middleware ASGI puro).
+
+Solo se comprimen los tipos que merecen la pena (JSON, CSV, NDJSON) y, si la
+respuesta es de una pieza, solo si pasa de COMPRESSION_MINIMUM_SIZE bytes.
+Las respuestas en streaming (/telemetry/export) se comprimen trozo a trozo
+con flush en cada uno, sin acumularlas en memoria. SSE no se toca.
+
+brotli es opcional: si no está instalado solo se ofrece gzip.
+"""
+from __future__ import annotations
+
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # dependencia opcional
+    brotli = None
+
+COMPRESSIBLE_TYPES = {"application/json", "text/csv", "application/x-ndjson"}
+
+
+class _Gzip:
+    def __init__(self, level: int) -> None:
+        # wbits 16 + MAX_WBITS = formato gzip (cabecera + crc)
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._z.compress(data) + self._z.flush()
+
+
+class _Brotli:
+    def __init__(self, quality: int) -> None:
+        self._c = brotli.Compressor(quality=quality)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._c.process(data) + self._c.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._c.process(data) + self._c.finish()
+
+
+def _accepted_encodings(header: str) -> set[str]:
+    out = set()
+    for part in header.split(","):
+        name, *params = (p.strip() for p in part.split(";"))
+        q = 1.0
+        for p in params:
+            if p.startswith("q="):
+                try:
+                    q = float(p[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            out.add(name.lower())
+    return out
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _pick(self, scope) -> str | None:
+        accepted = _accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def _compressor(self, encoding: str):
+        return _Brotli(self.brotli_quality) if encoding == "br" else _Gzip(self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self._pick(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None  # None hasta decidir; False = no se comprime
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+                if (
+                    media_type in COMPRESSIBLE_TYPES
+                    and "content-encoding" not in headers
+                    and message["status"] not in (204, 304)
+                ):
+                    # esperamos al primer trozo para saber si es streaming y su tamaño
+                    start_message = message
+                else:
+                    compressor = False
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body" or compressor is False:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                headers = MutableHeaders(scope=start_message)
+                if not more_body and len(body) < self.minimum_size:
+                    compressor = False
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressor = self._compressor(encoding)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    # streaming: no sabemos la longitud final
+                    del headers["Content-Length"]
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": compressor.chunk(body), "more_body": True})
+                else:
+                    compressed = compressor.finish(body)
+                    headers["Content-Length"] = str(len(compressed))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": compressed})
+                return
+
+            if more_body:
+                await send({"type": "http.response.body", "body": compressor.chunk(body), "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": compressor.finish(body)})
+
+        await self.app(scope, receive, send_compressed)
@@ -14,12 +14,79 @@ class Settings(BaseSettings):
     database_url: str
     # Alembic y tu app a veces esperan este nombre:
     SQLALCHEMY_DATABASE_URI: str | None = None
+    # URL para el motor async de la API (asyncpg). Si no se pone, se saca de database_url
+    async_database_url: str | None = None
+
+    # pool del motor async (por worker). Con N workers el máximo de conexiones
+    # es N * (db_pool_size + db_max_overflow): ajustarlo contra max_connections
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30  # segundos esperando conexión antes de dar error
+    db_pool_recycle: int = 1800  # segundos; -1 = nunca reciclar
+    # pre-ping = un round trip extra en cada checkout. Si se desactiva, conviene
+    # que db_pool_recycle sea menor que el idle timeout de Postgres / pgbouncer
+    db_pool_pre_ping: bool = True
+
+    # réplicas de lectura, separadas por comas (READ_REPLICA_URLS=postgresql://r1/...,postgresql://r2/...)
+    read_replica_urls: str | None = None
+    # segundos que una réplica caída queda fuera de la rotación
+    read_replica_eject_seconds: int = 30
+
+    # ==== INSTRUMENTACIÓN SQL POR PETICIÓN (app/sql_stats.py) ====
+    sql_stats_enabled: bool = False
+    sql_n_plus_one_threshold: int = 10  # misma sentencia > N veces en una petición = aviso
+    sql_slow_db_ms: float = 500  # loguear peticiones con más tiempo que esto en BBDD
 
     # ==== JWT ====
     jwt_secret_key: str  # en .env: JWT_SECRET_KEY=...
     jwt_algorithm: str = "HS256"  # en .env: JWT_ALGORITHM=HS256
     access_token_expire_minutes: int = 60  # en .env: ACCESS_TOKEN_EXPIRE_MINUTES=1440
 
+    # hashing de contraseñas (app/security.py): procesos por worker (0 = threadpool
+    # como antes), hashes a la vez y segundos esperando turno antes de dar 503
+    password_hash_workers: int = 2
+    password_hash_concurrency: int = 2
+    password_hash_queue_timeout: float = 5
+    password_hash_nice: int = 10  # prioridad de esos procesos (0 = la misma que la API)
+
+    # caché de usuarios autenticados en get_current_user (por worker); ttl 0 = desactivada
+    auth_cache_ttl_seconds: int = 60
+    auth_cache_max_size: int = 10000
+
+    # índice de propiedad granjas/naves/dispositivos por usuario (app/ownership.py)
+    ownership_cache_ttl_seconds: int = 300
+    ownership_cache_max_size: int = 10000
+
+    # ==== PARTICIONES DE TELEMETRY ====
+    telemetry_partitions_ahead: int = 3  # meses por delante que deja creados manage_partitions.py
+    telemetry_retention_months: int | None = None  # None = no se desengancha nada
+    # usar telemetry_1h / telemetry_1d en /telemetry/aggregate (requiere la migración de rollups)
+    telemetry_use_rollups: bool = True
+
+    # ==== CACHÉ DE RESPUESTAS (app/response_cache.py) ====
+    response_cache_ttl_seconds: int = 60  # 0 = desactivada
+    response_cache_max_size: int = 5000
+    response_cache_url: str | None = None  # redis://... para compartirla entre workers
+
+    # ==== RESPUESTAS JSON ====
+    fast_json: bool = True  # listados grandes con orjson (app/fast_json.py), si está instalado
+
+    # ==== LOGS (app/logger.py) ====
+    log_dir: str | None = None  # carpeta de app.log (por defecto logs/ del proyecto)
+    log_max_bytes: int = 10 * 1024 * 1024  # logs/app.log rota al pasar de aquí... (0 = sin límite)
+    log_rotate_when: str = "midnight"  # ...o con este intervalo de TimedRotatingFileHandler
+    log_backup_count: int = 14  # ficheros rotados que se guardan
+    # fracción de líneas "listed N results" que se escriben (1 = todas, 0 = ninguna)
+    log_list_sample_rate: float = 0.1
+    # por ruta, en JSON: LOG_LIST_SAMPLE_RATES={"/devices/": 1, "/telemetry/": 0.01}
+    log_list_sample_rates: dict[str, float] = {}
+
+    # ==== COMPRESIÓN DE RESPUESTAS (app/compression.py) ====
+    compression_enabled: bool = True
+    compression_minimum_size: int = 1024  # bytes; las respuestas más pequeñas van tal cual
+    compression_gzip_level: int = 6  # 1-9
+    compression_brotli_quality: int = 4  # 0-11 (a partir de ~6 el CPU se dispara)
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -32,6 +99,25 @@ class Settings(BaseSettings):
         # si no nos han puesto SQLALCHEMY_DATABASE_URI, usamos database_url
         return self.SQLALCHEMY_DATABASE_URI or self.database_url
 
+    def get_async_db_uri(self) -> str:
+        return self.async_database_url or _to_async_url(self.database_url)
+
+    def get_read_replica_uris(self) -> list[str]:
+        if not self.read_replica_urls:
+            return []
+        return [_to_async_url(u.strip()) for u in self.read_replica_urls.split(",") if u.strip()]
+
+
+def _to_async_url(url: str) -> str:
+    # postgresql+psycopg2://... -> postgresql+asyncpg://...
+    # sqlite:///... -> sqlite+aiosqlite:///... (para pruebas locales con ficheros)
+    scheme, sep, rest = url.partition("://")
+    if scheme.startswith("postgresql"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    if scheme == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    return url
+
 
 @lru_cache
 def get_settings() -> Settings:
@@ -1,17 +1,121 @@
 # app/database.py
-from sqlalchemy import create_engine
+import itertools
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.config import settings
+from app.pool_metrics import InstrumentedAsyncPool
 
-engine = create_engine(settings.database_url, pool_pre_ping=True)
+# motor síncrono: Alembic, create_first_user.py, manage_partitions.py y el LISTEN de app/live.py
+engine = create_engine(settings.database_url, pool_pre_ping=settings.db_pool_pre_ping)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# motor async (asyncpg): lo usan todos los routers
+async_engine = create_async_engine(
+    settings.get_async_db_uri(),
+    poolclass=InstrumentedAsyncPool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+)
+
+# expire_on_commit=False: en async no hay lazy loads, así que no queremos que
+# un commit deje los objetos caducados
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# ========== RÉPLICAS DE LECTURA ==========
+class ReplicaSet:
+    """
+    Reparte las lecturas entre réplicas en round-robin. Una réplica que da
+    error de conexión se saca de la rotación durante `eject_seconds`; si no
+    queda ninguna sana, se lee del primario.
+    """
+
+    def __init__(self, engines: list[AsyncEngine], eject_seconds: float) -> None:
+        self.engines = engines
+        self.eject_seconds = eject_seconds
+        self._ejected_until: dict[AsyncEngine, float] = {}
+        self._rr = itertools.cycle(engines) if engines else None
+        self._lock = threading.Lock()
+
+        for e in engines:
+            event.listen(e.sync_engine, "handle_error", self._on_error(e))
+
+    def _on_error(self, replica: AsyncEngine):
+        def handle_error(context):
+            if context.is_disconnect or isinstance(context.original_exception, OSError):
+                self.eject(replica)
+        return handle_error
+
+    def eject(self, replica: AsyncEngine) -> None:
+        with self._lock:
+            self._ejected_until[replica] = time.monotonic() + self.eject_seconds
+
+    def pick(self) -> AsyncEngine | None:
+        if self._rr is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.engines)):
+                replica = next(self._rr)
+                if self._ejected_until.get(replica, 0) <= now:
+                    return replica
+        return None
+
+    def status(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "url": e.url.render_as_string(hide_password=True),
+                "healthy": self._ejected_until.get(e, 0) <= now,
+            }
+            for e in self.engines
+        ]
+
+
+replicas = ReplicaSet(
+    [
+        create_async_engine(
+            url,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=settings.db_pool_recycle,
+            pool_pre_ping=settings.db_pool_pre_ping,
+        )
+        for url in settings.get_read_replica_uris()
+    ],
+    eject_seconds=settings.read_replica_eject_seconds,
+)
+
+
+def get_read_engine() -> AsyncEngine:
+    """Réplica sana por round-robin, o el primario si no hay."""
+    return replicas.pick() or async_engine
+
+
+async def get_read_db():
+    """
+    Sesión para rutas de solo lectura (listados, telemetría). Las escrituras y
+    los flujos de leer-lo-que-acabo-de-escribir usan get_db (primario).
+    """
+    async with AsyncSessionLocal(bind=get_read_engine()) as db:
         yield db
-    finally:
-        db.close()
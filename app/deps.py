@@ -1,19 +1,52 @@
 # app/deps.py
+import time
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 
+from .cache import TTLCache
+from .config import settings
 from .database import get_db
 from . import models
+from .ownership import owns_device_key
 from .security import decode_access_token
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-def get_current_user(
+# token -> (user_id, User suelto). Evita decodificar el JWT y el SELECT a users
+# en cada petición autenticada.
+_user_cache = TTLCache(
+    max_size=settings.auth_cache_max_size,
+    ttl=settings.auth_cache_ttl_seconds,
+)
+
+
+def invalidate_user(user_id: int) -> None:
+    """Olvida todos los tokens cacheados de ese usuario."""
+    _user_cache.pop_where(lambda _token, entry: entry[0] == user_id)
+
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_user_on_change(mapper, connection, target) -> None:
+    # cualquier cambio en un usuario (desactivarlo, cambiar la contraseña...)
+    # tira sus entradas de la caché de este proceso
+    invalidate_user(target.id)
+
+
+async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> models.User:
+    cached = _user_cache.get(token)
+    if cached is not None:
+        # merge sin load: copia el usuario a esta sesión sin tocar la BBDD
+        return await db.merge(cached[1], load=False)
+
     payload = decode_access_token(token)
     if payload is None or "sub" not in payload:
         raise HTTPException(
@@ -22,55 +55,30 @@ def get_current_user(
         )
 
     user_id = int(payload["sub"])
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await db.get(models.User, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
         )
+
+    if _user_cache.enabled:
+        # guardamos una copia fuera de la sesión (no la caduca ningún commit)
+        # y nunca más allá de la expiración del propio token
+        ttl = payload["exp"] - time.time() if "exp" in payload else None
+        _user_cache.set(token, (user_id, _detached_copy(user)), ttl=ttl)
     return user
 
 
-def get_farm_owned(farm_id: int, db: Session, current_user: models.User) -> models.Farm:
-    farm = (
-        db.query(models.Farm)
-        .filter(
-            models.Farm.id == farm_id,
-            models.Farm.owner_user_id == current_user.id,
-        )
-        .first()
-    )
-    if not farm:
-        raise HTTPException(status_code=404, detail="Farm not found")
-    return farm
-
-
-def get_shed_owned(shed_id: int, db: Session, current_user: models.User) -> models.Shed:
-    shed = (
-        db.query(models.Shed)
-        .join(models.Farm, models.Shed.farm_id == models.Farm.id)
-        .filter(
-            models.Shed.id == shed_id,
-            models.Farm.owner_user_id == current_user.id,
-        )
-        .first()
+def _detached_copy(user: models.User) -> models.User:
+    copy = models.User(
+        **{attr.key: getattr(user, attr.key) for attr in inspect(models.User).column_attrs}
     )
-    if not shed:
-        raise HTTPException(status_code=404, detail="Shed not found")
-    return shed
-
-
-def get_device_owned(device_id: int, db: Session, current_user: models.User) -> models.Device:
-    device = (
-        db.query(models.Device)
-        .join(models.Shed, models.Device.shed_id == models.Shed.id)
-        .join(models.Farm, models.Shed.farm_id == models.Farm.id)
-        .filter(
-            models.Device.id == device_id,
-            models.Farm.owner_user_id == current_user.id,
-        )
-        .first()
-    )
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found")
-    return device
+    make_transient_to_detached(copy)
+    return copy
+
+
+async def check_device_key_owned(device_key: str, db: AsyncSession, current_user: models.User) -> None:
+    """Solo comprueba la propiedad (búsqueda en el índice, sin query a devices)."""
+    if not await owns_device_key(db, current_user.id, device_key):
+        raise HTTPException(status_code=404, detail="Device not found or not yours")
@@ -0,0 +1,90 @@
+# app/etags.py
+"""
+ETags débiles para los endpoints que el dashboard consulta en bucle.
+
+La etiqueta sale de una lectura de UNA fila, antes de la query "de verdad":
+si el If-None-Match coincide se responde 304 sin sacar filas ni serializar.
+
+- /farms/ y /devices/with-latest: los contadores del usuario en
+  `etag_versions` (migración b6d4e8a2c913). hierarchy_version lo suben los
+  create_* con bump_hierarchy_version(), en la misma transacción; y
+  telemetry_version un trigger sobre telemetry con cada lectura nueva de sus
+  dispositivos.
+- /by-device-key: (ts_utc, id) de la última lectura, del índice covering.
+"""
+from __future__ import annotations
+
+import hashlib
+
+from fastapi import Request, Response
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# la cabecera que acompaña a todas las respuestas con ETag: que el navegador
+# guarde la respuesta pero pregunte siempre
+CACHE_CONTROL = "private, no-cache"
+
+VERSIONS_SQL = text(
+    "SELECT hierarchy_version, telemetry_version FROM etag_versions WHERE user_id = :uid"
+)
+
+BUMP_HIERARCHY_SQL = text(
+    """
+    INSERT INTO etag_versions (user_id, hierarchy_version) VALUES (:uid, 1)
+    ON CONFLICT (user_id) DO UPDATE SET hierarchy_version = etag_versions.hierarchy_version + 1
+    """
+)
+
+LATEST_VERSION_SQL = text(
+    """
+    SELECT ts_utc, id FROM telemetry
+    WHERE device_key = :device_key
+    ORDER BY ts_utc DESC, id DESC
+    LIMIT 1
+    """
+)
+
+
+def weak_etag(*parts) -> str:
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def matches(request: Request, etag: str) -> bool:
+    """¿El If-None-Match de la petición incluye esta ETag? (comparación débil)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def etag_headers(etag: str) -> dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+async def user_versions(db: AsyncSession, user_id: int) -> tuple[int, int]:
+    """(hierarchy_version, telemetry_version) del usuario; (0, 0) si no tiene fila."""
+    row = (await db.execute(VERSIONS_SQL, {"uid": user_id})).first()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+async def hierarchy_version(db: AsyncSession, user_id: int) -> int:
+    return (await user_versions(db, user_id))[0]
+
+
+async def bump_hierarchy_version(db: AsyncSession, user_id: int) -> None:
+    """Llamar en los create_* antes del commit, en la misma transacción."""
+    await db.execute(BUMP_HIERARCHY_SQL, {"uid": user_id})
+
+
+async def latest_version(db: AsyncSession, device_key: str) -> tuple | None:
+    """(ts_utc, id) de la última lectura del dispositivo, o None si no tiene."""
+    row = (await db.execute(LATEST_VERSION_SQL, {"device_key": device_key})).first()
+    return tuple(row) if row else None
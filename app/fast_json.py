@@ -0,0 +1,50 @@
+# app/fast_json.py
+"""
+Respuestas JSON rápidas para los listados grandes (telemetría, dispositivos).
+
+FastAPI por defecto pasa lo que devuelve la ruta por `jsonable_encoder` (que
+recorre y copia cada dict) y luego por `json.dumps`. Con miles de filas eso es
+casi todo el CPU de la petición. Aquí las filas van directas a orjson, que
+sabe serializar datetime, y los Decimal pasan a float.
+
+Si orjson no está instalado, o FAST_JSON=false, se vuelve al camino de siempre.
+"""
+from __future__ import annotations
+
+from decimal import Decimal
+from typing import Any, Sequence
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+
+try:
+    import orjson
+except ImportError:  # dependencia opcional
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None and settings.fast_json:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def rows_to_dicts(rows: Sequence) -> list[dict]:
+    """Filas de SQLAlchemy (Row) a dicts, tal cual vienen de la query."""
+    if not rows:
+        return []
+    fields = rows[0]._fields
+    return [dict(zip(fields, r)) for r in rows]
@@ -0,0 +1,134 @@
+# app/http_metrics.py
+"""
+Latencia de las peticiones HTTP por ruta (la plantilla, p. ej.
+/telemetry/by-device-key/{device_key}), método y código de estado, más el nº
+de peticiones en curso. Middleware ASGI puro: no envuelve la respuesta como
+BaseHTTPMiddleware, así que no rompe el streaming.
+
+Se ve en GET /metrics, en formato texto de Prometheus o con ?format=json
+(p50/p95/p99 por ruta).
+"""
+from __future__ import annotations
+
+import time
+from collections import defaultdict
+
+from starlette.datastructures import MutableHeaders
+
+from app.metrics import Histogram
+
+UNMATCHED_ROUTE = "<unmatched>"  # 404 y demás: una sola serie, no una por URL
+
+
+class HTTPMetrics:
+    def __init__(self) -> None:
+        self.latency: dict[tuple[str, str, int], Histogram] = defaultdict(Histogram)
+        self.in_flight = 0
+
+    def observe(self, method: str, route: str, status: int, seconds: float) -> None:
+        self.latency[(method, route, status)].observe(seconds)
+
+    def snapshot(self) -> dict:
+        routes = []
+        for (method, route, status), hist in sorted(self.latency.items()):
+            snap = hist.snapshot()
+            routes.append(
+                {
+                    "method": method,
+                    "route": route,
+                    "status": status,
+                    "count": snap["count"],
+                    "sum_seconds": snap["sum"],
+                    "p50": hist.quantile(0.5),
+                    "p95": hist.quantile(0.95),
+                    "p99": hist.quantile(0.99),
+                }
+            )
+        return {"in_flight": self.in_flight, "routes": routes}
+
+    def prometheus(self) -> str:
+        lines = [
+            "# HELP http_request_duration_seconds Latencia de las peticiones HTTP.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route, status), hist in sorted(self.latency.items()):
+            labels = f'method="{method}",route="{_escape(route)}",status="{status}"'
+            snap = hist.snapshot()
+            for le, count in snap["buckets"].items():
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{le}"}} {count}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {snap['sum']}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {snap['count']}")
+        lines += [
+            "# HELP http_requests_in_flight Peticiones HTTP en curso.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def route_template(scope) -> str:
+    """
+    Plantilla de la ruta que ha casado, con el prefijo del include_router
+    (p. ej. /farms/{farm_id}/sheds). El router deja en el scope la ruta
+    relativa a su APIRouter, así que el prefijo se saca de la URL real.
+    """
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path is None:
+        return UNMATCHED_ROUTE
+    try:
+        rendered = route.path_format.format(**scope.get("path_params", {}))
+    except (AttributeError, KeyError, IndexError):
+        return path
+    full = scope.get("path", "")
+    if rendered and full.endswith(rendered):
+        return full[: len(full) - len(rendered)] + path
+    return path
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+http_metrics = HTTPMetrics()
+
+
+class TimingMiddleware:
+    """
+    Mide cada petición con perf_counter. Deja además la cabecera
+    X-Process-Time (tiempo hasta empezar a responder), como hacía el
+    middleware anterior.
+    """
+
+    def __init__(self, app, metrics: HTTPMetrics = http_metrics) -> None:
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        self.metrics.in_flight += 1
+
+        async def send_timed(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append(
+                    "X-Process-Time", f"{time.perf_counter() - start:.3f}s"
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            self.metrics.in_flight -= 1
+            self.metrics.observe(
+                scope["method"],
+                route_template(scope),
+                status,
+                time.perf_counter() - start,
+            )
@@ -0,0 +1,113 @@
+# app/live.py
+"""
+Hub en proceso para empujar telemetría en directo (/telemetry/stream).
+
+Un único hilo por worker hace LISTEN sobre el canal `telemetry` (lo alimenta
+el trigger telemetry_notify) y reparte cada lectura a las colas de los
+clientes suscritos a ese device_key. N pantallas abiertas = 1 conexión
+LISTEN, no N bucles de polling.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import select
+import threading
+from collections import defaultdict
+
+from sqlalchemy.engine import Engine
+
+from app.database import engine
+from app.logger import logger
+
+CHANNEL = "telemetry"
+
+# lecturas en cola por cliente; si un cliente lento se llena, se descartan las más viejas
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+class TelemetryHub:
+    def __init__(self, bind: Engine = engine) -> None:
+        self._engine = bind
+        self._subs: dict[str, set[asyncio.Queue]] = defaultdict(set)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    # ---------- suscripciones ----------
+    def subscribe(self, device_keys: list[str]) -> asyncio.Queue:
+        """Registra una cola para esos device_key. Llamar desde el event loop."""
+        self._ensure_listener()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        for dk in device_keys:
+            self._subs[dk].add(queue)
+        return queue
+
+    def unsubscribe(self, device_keys: list[str], queue: asyncio.Queue) -> None:
+        for dk in device_keys:
+            queues = self._subs.get(dk)
+            if queues is None:
+                continue
+            queues.discard(queue)
+            if not queues:
+                del self._subs[dk]
+
+    def publish(self, reading: dict) -> None:
+        """Reparte una lectura a sus suscriptores. Se ejecuta en el event loop."""
+        for queue in self._subs.get(reading.get("device_key"), ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(reading)
+
+    # ---------- listener de Postgres ----------
+    def _ensure_listener(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen_forever, name="telemetry-listen", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _listen_forever(self) -> None:
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                self._listen()
+                backoff = 1
+            except Exception:
+                logger.exception("Telemetry LISTEN connection failed, retrying in %ss", backoff)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def _listen(self) -> None:
+        # conexión propia fuera del pool: se queda enganchada mientras viva el worker
+        raw = self._engine.raw_connection()
+        # detach() suelta el registro del pool y con él driver_connection (pasa
+        # a None): la conexión del driver se coge de dbapi_connection
+        raw.detach()
+        pg = raw.dbapi_connection
+        try:
+            pg.autocommit = True
+            with pg.cursor() as cur:
+                cur.execute(f"LISTEN {CHANNEL}")
+            logger.info("Listening for telemetry notifications")
+
+            while not self._stop.is_set():
+                if select.select([pg], [], [], 5) == ([], [], []):
+                    continue
+                pg.poll()
+                while pg.notifies:
+                    note = pg.notifies.pop(0)
+                    try:
+                        reading = json.loads(note.payload)
+                    except ValueError:
+                        continue
+                    self._loop.call_soon_threadsafe(self.publish, reading)
+        finally:
+            raw.close()
+
+
+hub = TelemetryHub()
@@ -1,42 +1,192 @@
 # app/logger.py
+"""
+Logging sin bloquear las peticiones.
+
+El logger "cerdiot" solo tiene un QueueHandler: la petición deja el registro
+en una cola en memoria y sigue. Un QueueListener (hilo aparte) lo saca y lo
+escribe en:
+
+- logs/app.log (o LOG_DIR/app.log), una línea JSON por registro, rotando a
+  medianoche y también al pasar de LOG_MAX_BYTES (lo que ocurra antes).
+- la consola, en texto como siempre.
+
+Los "listed N results" de los listados son lo más frecuente del log y lo que
+menos aporta, así que se muestrean por ruta: se marcan con
+extra={"sample_route": "/devices/"} y solo se escribe 1 de cada 1/rate (el
+registro lleva "sample_rate" para poder reescalar al contar). Warnings y
+errores no se muestrean nunca.
+"""
 from __future__ import annotations
 
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime, timezone
 from pathlib import Path
 
+from app.config import settings
 
-def get_logger(name: str = "cerdiot") -> logging.Logger:
+# atributos propios de LogRecord: el resto son los extra=... de cada llamada
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message",
+    "asctime",
+}
+
+_queue: queue.SimpleQueue | None = None
+_listener: logging.handlers.QueueListener | None = None
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                out[key] = value
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            out["exc"] = record.exc_text
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class SizeAndTimeRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """TimedRotatingFileHandler que además rota al pasar de max_bytes."""
+
+    def __init__(self, filename, max_bytes: int, **kwargs) -> None:
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record) -> bool:
+        if super().shouldRollover(record):
+            return True
+        if self.max_bytes <= 0:
+            return False
+        if self.stream is None:
+            self.stream = self._open()
+        self.stream.seek(0, os.SEEK_END)
+        return self.stream.tell() + len(self.format(record)) + 1 >= self.max_bytes
+
+    def rotation_filename(self, default_name: str) -> str:
+        # varias rotaciones por tamaño el mismo día: app.log.2026-10-17.1, .2...
+        # (el padre borraría el fichero anterior con el mismo nombre)
+        name, n = default_name, 0
+        while os.path.exists(name):
+            n += 1
+            name = f"{default_name}.{n}"
+        return super().rotation_filename(name)
+
+
+class SamplingFilter(logging.Filter):
+    """Deja pasar 1 de cada 1/rate registros INFO marcados con sample_route."""
+
+    def __init__(self, default_rate: float, rates: dict[str, float]) -> None:
+        super().__init__()
+        self.default_rate = default_rate
+        self.rates = rates
+        self._seen: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        route = getattr(record, "sample_route", None)
+        if route is None or record.levelno > logging.INFO:
+            return True
+        rate = self.rates.get(route, self.default_rate)
+        if rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        with self._lock:
+            n = self._seen.get(route, 0)
+            self._seen[route] = n + 1
+        if n % round(1 / rate):
+            return False
+        record.sample_rate = rate
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
     """
-    Devuelve un logger configurado. Si ya está configurado, lo devuelve tal cual.
+    Igual que el de la stdlib pero sin pegar el traceback al mensaje, para que
+    en el JSON vaya aparte ("exc"). El traceback se formatea aquí porque el
+    registro no debe llevarse los frames a otro hilo.
     """
-    logger = logging.getLogger(name)
-    if logger.handlers:
-        return logger
 
-    logger.setLevel(logging.INFO)
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
 
-    # /opt/iot-backend/logs
-    base_dir = Path(__file__).resolve().parent.parent
-    logs_dir = base_dir / "logs"
-    logs_dir.mkdir(exist_ok=True)
 
-    log_file = logs_dir / "app.log"
+def _start_listener() -> queue.SimpleQueue:
+    """Una sola cola y un solo hilo por proceso, para todos los loggers."""
+    global _queue, _listener
+    if _queue is not None:
+        return _queue
 
-    fmt = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-    )
+    # /opt/iot-backend/logs salvo que venga LOG_DIR
+    base_dir = Path(__file__).resolve().parent.parent
+    logs_dir = Path(settings.log_dir) if settings.log_dir else base_dir / "logs"
+    logs_dir.mkdir(parents=True, exist_ok=True)
 
-    # a fichero
-    fh = logging.FileHandler(log_file)
+    # a fichero, en JSON
+    fh = SizeAndTimeRotatingFileHandler(
+        logs_dir / "app.log",
+        max_bytes=settings.log_max_bytes,
+        when=settings.log_rotate_when,
+        backupCount=settings.log_backup_count,
+        encoding="utf-8",
+        utc=True,
+    )
     fh.setLevel(logging.INFO)
-    fh.setFormatter(fmt)
-    logger.addHandler(fh)
+    fh.setFormatter(JSONFormatter())
 
     # a consola
     sh = logging.StreamHandler()
     sh.setLevel(logging.INFO)
-    sh.setFormatter(fmt)
-    logger.addHandler(sh)
+    sh.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+
+    _queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(_queue, fh, sh, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _queue
+
+
+def stop_logging() -> None:
+    """Vacía la cola y para el hilo que escribe (al apagar la API)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str = "cerdiot") -> logging.Logger:
+    """
+    Devuelve un logger configurado. Si ya está configurado, lo devuelve tal cual.
+    """
+    logger = logging.getLogger(name)
+    if logger.handlers:
+        return logger
+
+    logger.setLevel(logging.INFO)
+
+    qh = _QueueHandler(_start_listener())
+    qh.addFilter(SamplingFilter(settings.log_list_sample_rate, settings.log_list_sample_rates))
+    logger.addHandler(qh)
 
     return logger
 
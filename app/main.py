@@ -1,11 +1,18 @@
 # /opt/iot-backend/app/main.py
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import time
+from fastapi.responses import JSONResponse, PlainTextResponse
 
+from app.compression import CompressionMiddleware
 from app.config import settings
-from app.logger import get_logger
+from app.database import async_engine, replicas
+from app.http_metrics import TimingMiddleware, http_metrics
+from app.live import hub
+from app.logger import get_logger, stop_logging
+from app.pool_metrics import pool_status
+from app.response_cache import response_cache
+from app.security import shutdown_hash_pool, start_hash_pool
+from app.sql_stats import SQLStatsMiddleware, install_sql_hooks
 from app.routers import auth, farms, sheds, devices, telemetry
 
 logger = get_logger()
@@ -31,33 +38,46 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing", "ETag"],  # paginación, métricas SQL y GET condicional
 )
 
+# ========== COMPRESIÓN ==========
+if settings.compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_minimum_size,
+        gzip_level=settings.compression_gzip_level,
+        brotli_quality=settings.compression_brotli_quality,
+    )
 
-# ========== MIDDLEWARES ==========
+# ========== MÉTRICAS SQL POR PETICIÓN ==========
+if settings.sql_stats_enabled:
+    install_sql_hooks()
+    app.add_middleware(
+        SQLStatsMiddleware,
+        n_plus_one_threshold=settings.sql_n_plus_one_threshold,
+        slow_db_ms=settings.sql_slow_db_ms,
+    )
 
-@app.middleware("http")
-async def add_process_time_header(request: Request, call_next):
-    """
-    Mide el tiempo que tarda cada petición y lo mete en la cabecera.
-    Útil para ver si algo se está volviendo lento.
-    """
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = f"{process_time:.3f}s"
-    return response
+
+# ========== TIEMPOS POR RUTA ==========
+# el último en añadirse es el más externo: mide todo lo demás
+app.add_middleware(TimingMiddleware)
 
 
 # ========== EVENTOS DE ARRANQUE/APAGADO ==========
 
 @app.on_event("startup")
 async def startup_event():
+    start_hash_pool()
     logger.info("🚀 CerdIoT API iniciada correctamente")
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    hub.stop()
+    shutdown_hash_pool()
     logger.info("🛑 CerdIoT API detenida")
+    stop_logging()  # vacía la cola de logs antes de salir
 
 
 # ========== HANDLERS DE ERRORES BONITOS ==========
@@ -75,6 +95,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
             "message": exc.detail,
             "path": request.url.path,
         },
+        headers=getattr(exc, "headers", None),  # Retry-After, WWW-Authenticate...
     )
 
 
@@ -123,6 +144,37 @@ def version():
     }
 
 
+@app.get("/metrics", tags=["system"])
+def metrics(fmt: str = Query("prometheus", alias="format", pattern="^(prometheus|json)$")):
+    """
+    Latencias HTTP de este worker por ruta, método y código (histogramas tipo
+    Prometheus) y peticiones en curso. Con ?format=json, p50/p95/p99 por ruta.
+    """
+    if fmt == "json":
+        return http_metrics.snapshot()
+    return PlainTextResponse(http_metrics.prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/db-pool", tags=["system"])
+def db_pool_metrics():
+    """
+    Estado del pool de conexiones de este worker: conexiones en uso, overflow,
+    esperas para conseguir conexión (p50/p95/p99 + histograma) y timeouts.
+    También el estado de las réplicas de lectura, si las hay.
+    """
+    return {**pool_status(async_engine.pool), "replicas": replicas.status()}
+
+
+@app.get("/metrics/response-cache", tags=["system"])
+def response_cache_metrics():
+    """Aciertos/fallos de la caché de respuestas por ruta (de este worker)."""
+    return {
+        "backend": type(response_cache.backend).__name__,
+        "ttl_seconds": response_cache.ttl,
+        **response_cache.stats.snapshot(),
+    }
+
+
 # ========== ROUTERS ==========
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(farms.router, prefix="/farms", tags=["farms"])
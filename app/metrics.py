@@ -0,0 +1,51 @@
+# app/metrics.py
+"""
+Métricas en memoria (por proceso), sin dependencias externas.
+"""
+from __future__ import annotations
+
+import bisect
+import threading
+
+# segundos: de 1 ms a 10 s
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Histograma acumulativo tipo Prometheus (buckets `le`)."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # el último es +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+
+    def quantile(self, q: float) -> float | None:
+        """Estimación del cuantil: el borde superior del bucket donde cae."""
+        with self._lock:
+            if not self._count:
+                return None
+            target = q * self._count
+            seen = 0
+            for i, c in enumerate(self._counts):
+                seen += c
+                if seen >= target:
+                    return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cumulative, acc = {}, 0
+            for le, c in zip(self.buckets, self._counts):
+                acc += c
+                cumulative[str(le)] = acc
+            cumulative["+Inf"] = self._count
+            return {"buckets": cumulative, "sum": self._sum, "count": self._count}
@@ -7,6 +7,7 @@ from sqlalchemy import (
     ForeignKey,
     DateTime,
     Float,
+    Index,
 )
 from sqlalchemy.orm import relationship
 
@@ -40,6 +41,9 @@ class User(Base):
 
 class Farm(Base):
     __tablename__ = "farms"
+    # farms/sheds/devices llevan índices con INCLUDE para que el índice de
+    # propiedad (app/ownership.py) salga con index-only scans
+    __table_args__ = (Index("ix_farms_owner_user_id", "owner_user_id", postgresql_include=["id"]),)
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -62,6 +66,7 @@ class Farm(Base):
 
 class Shed(Base):
     __tablename__ = "sheds"
+    __table_args__ = (Index("ix_sheds_farm_id", "farm_id", postgresql_include=["id"]),)
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -84,6 +89,7 @@ class Shed(Base):
 
 class Device(Base):
     __tablename__ = "devices"
+    __table_args__ = (Index("ix_devices_shed_id", "shed_id", postgresql_include=["id", "device_key"]),)
 
     id = Column(Integer, primary_key=True, index=True)
     device_key = Column(String, unique=True, index=True, nullable=False)
@@ -0,0 +1,146 @@
+# app/ownership.py
+"""
+Índice de propiedad por usuario: qué granjas, naves, dispositivos y device_key
+son suyos. Se construye con una sola query y se cachea, así las comprobaciones
+de "¿esto es del usuario?" en las rutas calientes son búsquedas en un set.
+
+- Los create_* llaman a invalidate_ownership() al hacer commit.
+- El índice se guarda con la hierarchy_version del usuario (etag_versions,
+  app/etags.py) con la que se leyó. Si algo no aparece, antes de dar 404 se
+  mira esa versión (una fila por clave primaria): solo si ha cambiado, por un
+  alta en otro worker, se reconstruye. Así los 404 de verdad (ids ajenos o
+  inventados) no releen toda la jerarquía en cada petición.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.cache import TTLCache
+from app.config import settings
+from app.database import AsyncSessionLocal, async_engine
+from app.etags import hierarchy_version
+
+
+@dataclass(frozen=True)
+class Ownership:
+    farm_ids: frozenset[int]
+    shed_ids: frozenset[int]
+    device_keys: frozenset[str]
+    keys_by_shed: dict[int, tuple[str, ...]]
+    keys_by_farm: dict[int, tuple[str, ...]]
+
+
+_ownership_cache = TTLCache(
+    max_size=settings.ownership_cache_max_size,
+    ttl=settings.ownership_cache_ttl_seconds,
+)
+
+
+def ownership_query(user_id: int):
+    """Toda la jerarquía del usuario en una query (LEFT JOIN farms → sheds → devices)."""
+    return (
+        select(models.Farm.id, models.Shed.id, models.Device.id, models.Device.device_key)
+        .outerjoin(models.Shed, models.Shed.farm_id == models.Farm.id)
+        .outerjoin(models.Device, models.Device.shed_id == models.Shed.id)
+        .where(models.Farm.owner_user_id == user_id)
+    )
+
+
+@asynccontextmanager
+async def _primary(db: AsyncSession):
+    """
+    El índice y su versión siempre se leen del primario, para no cachear una
+    foto sin la granja/nave/device que se acaba de crear: si la sesión de la
+    ruta ya es del primario se usa esa; si es de una réplica se abre UNA del
+    primario para todo lo que haga falta (versión + jerarquía).
+    """
+    if db.bind is async_engine:
+        yield db
+    else:
+        async with AsyncSessionLocal() as primary:
+            yield primary
+
+
+async def load_ownership(db: AsyncSession, user_id: int) -> Ownership:
+    rows = (await db.execute(ownership_query(user_id))).all()
+
+    farm_ids, shed_ids, device_keys = set(), set(), set()
+    keys_by_shed: dict[int, list[str]] = defaultdict(list)
+    keys_by_farm: dict[int, list[str]] = defaultdict(list)
+    for farm_id, shed_id, device_id, device_key in rows:
+        farm_ids.add(farm_id)
+        if shed_id is not None:
+            shed_ids.add(shed_id)
+        if device_id is not None:
+            device_keys.add(device_key)
+            keys_by_shed[shed_id].append(device_key)
+            keys_by_farm[farm_id].append(device_key)
+
+    return Ownership(
+        farm_ids=frozenset(farm_ids),
+        shed_ids=frozenset(shed_ids),
+        device_keys=frozenset(device_keys),
+        keys_by_shed={k: tuple(v) for k, v in keys_by_shed.items()},
+        keys_by_farm={k: tuple(v) for k, v in keys_by_farm.items()},
+    )
+
+
+async def _build(db: AsyncSession, user_id: int) -> Ownership:
+    # la versión antes que las filas: si entra un alta entre las dos, el
+    # índice queda más nuevo que su versión y como mucho se rehace de más
+    version = await hierarchy_version(db, user_id)
+    ownership = await load_ownership(db, user_id)
+    _ownership_cache.set(user_id, (version, ownership))
+    return ownership
+
+
+async def get_ownership(db: AsyncSession, user_id: int, refresh: bool = False) -> Ownership:
+    """
+    Índice del usuario. Con refresh=True se comprueba su versión contra
+    etag_versions y se reconstruye solo si ha cambiado.
+    """
+    cached = _ownership_cache.get(user_id)
+    if cached is not None and not refresh:
+        return cached[1]
+    async with _primary(db) as primary:
+        if cached is not None and await hierarchy_version(primary, user_id) == cached[0]:
+            return cached[1]
+        return await _build(primary, user_id)
+
+
+def invalidate_ownership(user_id: int) -> None:
+    _ownership_cache.pop(user_id)
+
+
+async def _owns(db: AsyncSession, user_id: int, test: Callable[[Ownership], bool]) -> bool:
+    if test(await get_ownership(db, user_id)):
+        return True
+    # puede que el índice esté viejo (alta en otro worker): se mira su versión
+    return test(await get_ownership(db, user_id, refresh=True))
+
+
+async def owns_farm(db: AsyncSession, user_id: int, farm_id: int) -> bool:
+    return await _owns(db, user_id, lambda o: farm_id in o.farm_ids)
+
+
+async def owns_shed(db: AsyncSession, user_id: int, shed_id: int) -> bool:
+    return await _owns(db, user_id, lambda o: shed_id in o.shed_ids)
+
+
+async def owns_device_key(db: AsyncSession, user_id: int, device_key: str) -> bool:
+    return await _owns(db, user_id, lambda o: device_key in o.device_keys)
+
+
+async def owned_device_keys(db: AsyncSession, user_id: int, device_keys: set[str]) -> set[str]:
+    """Los device_key de la lista que son del usuario."""
+    ownership = await get_ownership(db, user_id)
+    if not device_keys <= ownership.device_keys:
+        ownership = await get_ownership(db, user_id, refresh=True)
+    return device_keys & ownership.device_keys
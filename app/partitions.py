@@ -0,0 +1,129 @@
+# app/partitions.py
+"""
+Mantenimiento de las particiones mensuales de `telemetry`.
+
+- ensure_partitions: crea por adelantado las particiones de los próximos meses.
+- detach_old_partitions: desengancha (y opcionalmente borra) las que se salen
+  de la retención. Borrar una partición entera es instantáneo comparado con
+  un DELETE de millones de filas.
+- partition_months: los meses con partición, para que la ingesta rechace por
+  fila las lecturas que no caben en ninguna (no hay partición DEFAULT: con
+  ella, una lectura de un mes futuro impediría crear luego su partición).
+"""
+from __future__ import annotations
+
+import re
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import TTLCache
+from app.logger import logger
+
+PARTITION_RE = re.compile(r"^telemetry_y(\d{4})m(\d{2})$")
+
+LIST_PARTITIONS_SQL = text(
+    """
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    JOIN pg_class p ON p.oid = i.inhparent
+    WHERE p.relname = 'telemetry'
+    """
+)
+
+# las particiones cambian una vez al día (cron): basta con mirarlas cada poco
+_months_cache = TTLCache(max_size=1, ttl=60)
+
+
+def _next_month(d: date) -> date:
+    return date(d.year + 1, 1, 1) if d.month == 12 else date(d.year, d.month + 1, 1)
+
+
+def _add_months(d: date, months: int) -> date:
+    idx = d.year * 12 + (d.month - 1) + months
+    return date(idx // 12, idx % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"telemetry_y{month.year:04d}m{month.month:02d}"
+
+
+def list_partitions(conn: Connection) -> dict[date, str]:
+    """Particiones mensuales enganchadas a telemetry: {primer día del mes: nombre}."""
+    return _parse_partitions(conn.execute(LIST_PARTITIONS_SQL).fetchall())
+
+
+def _parse_partitions(rows) -> dict[date, str]:
+    out: dict[date, str] = {}
+    for (name,) in rows:
+        m = PARTITION_RE.match(name)
+        if m:
+            out[date(int(m.group(1)), int(m.group(2)), 1)] = name
+    return out
+
+
+async def partition_months(db: AsyncSession) -> frozenset[date] | None:
+    """
+    Meses (primer día) que tienen partición, con caché de un minuto. None si
+    la BBDD no es Postgres (pruebas con sqlite): entonces no hay particiones.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+    months = _months_cache.get("months")
+    if months is None:
+        rows = (await db.execute(LIST_PARTITIONS_SQL)).fetchall()
+        months = frozenset(_parse_partitions(rows))
+        _months_cache.set("months", months)
+    return months
+
+
+def ensure_partitions(conn: Connection, months_ahead: int, today: date | None = None) -> list[str]:
+    """Crea las particiones que falten desde el mes actual hasta `months_ahead` meses después."""
+    today = today or datetime.now(timezone.utc).date()
+    existing = list_partitions(conn)
+
+    created: list[str] = []
+    month = today.replace(day=1)
+    for _ in range(months_ahead + 1):
+        if month not in existing:
+            name = partition_name(month)
+            conn.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF telemetry "
+                    f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+                    f"TO ('{_next_month(month).isoformat()} 00:00:00+00')"
+                )
+            )
+            created.append(name)
+            logger.info("Created telemetry partition %s", name)
+        month = _next_month(month)
+    return created
+
+
+def detach_old_partitions(
+    conn: Connection,
+    retention_months: int,
+    drop: bool = False,
+    today: date | None = None,
+) -> list[str]:
+    """
+    Desengancha las particiones cuyo mes entero queda fuera de la retención
+    (se conservan el mes actual y los `retention_months` anteriores).
+    Con drop=True además se borran.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    cutoff = _add_months(today.replace(day=1), -retention_months)
+
+    detached: list[str] = []
+    for month, name in sorted(list_partitions(conn).items()):
+        if month >= cutoff:
+            continue
+        conn.execute(text(f"ALTER TABLE telemetry DETACH PARTITION {name}"))
+        if drop:
+            conn.execute(text(f"DROP TABLE {name}"))
+        detached.append(name)
+        logger.info("%s telemetry partition %s", "Dropped" if drop else "Detached", name)
+    return detached
@@ -0,0 +1,58 @@
+# app/pool_metrics.py
+"""
+Instrumentación del pool de conexiones del motor async: cuánto se espera
+para conseguir conexión, cuántas veces se agota el pool_timeout y cómo está
+el pool en cada momento. Se ve en GET /metrics/db-pool.
+"""
+from __future__ import annotations
+
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.metrics import Histogram
+
+
+class PoolStats:
+    def __init__(self) -> None:
+        self.wait = Histogram()
+        self.checkouts = 0
+        self.timeouts = 0
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool que mide la espera de cada checkout."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            pool_stats.timeouts += 1
+            raise
+        finally:
+            pool_stats.wait.observe(time.perf_counter() - start)
+        pool_stats.checkouts += 1
+        return conn
+
+
+def pool_status(pool) -> dict:
+    wait = pool_stats.wait
+    return {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "checkouts": pool_stats.checkouts,
+        "timeouts": pool_stats.timeouts,
+        "wait_seconds": {
+            "p50": wait.quantile(0.5),
+            "p95": wait.quantile(0.95),
+            "p99": wait.quantile(0.99),
+            "histogram": wait.snapshot(),
+        },
+    }
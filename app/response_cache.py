@@ -0,0 +1,222 @@
+# app/response_cache.py
+"""
+Caché de respuestas para los GET que solo cambian cuando alguien llama a un
+create_* (listar granjas, naves, dispositivos...).
+
+    @router.get("/")
+    @response_cache.cached("farms", tags=(FARMS_TAG,))
+    async def list_my_farms(..., current_user = Depends(get_current_user)):
+        ...
+        return FastJSONResponse(...)
+
+- La clave es por usuario + parámetros de la ruta + versión de sus tags +
+  hierarchy_version del usuario (etag_versions, app/etags.py), leída con la
+  misma sesión `db` de la ruta.
+- Invalidar un tag (await response_cache.invalidate("farms:7")) es subirle la
+  versión: las entradas viejas ya no se encuentran y caducan solas por TTL.
+- Solo se guardan respuestas 200 que sean `Response` ya renderizadas
+  (FastJSONResponse), con sus cabeceras (ETag incluida).
+
+Con hierarchy_version en la clave, un acierto nunca es más viejo que lo que
+devolvería la ruta con esa misma sesión: los create_* la suben en su
+transacción y lo ven todos los workers, aunque el tag solo se invalide en
+uno. Por lo mismo los fallos se rellenan con la sesión de la ruta (réplica
+incluida): lo que se guarda es al menos tan nuevo como la versión de la clave.
+
+Backend por defecto: LRU en memoria (por worker). Con RESPONSE_CACHE_URL=
+redis://... la caché y las versiones de los tags se comparten entre workers.
+RedisBackend acepta cualquier cliente con la API de redis.asyncio, así que en
+local se puede probar con fakeredis.
+"""
+from __future__ import annotations
+
+import functools
+import hashlib
+import json
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Iterable
+
+from fastapi import Request, Response
+
+from app.cache import TTLCache
+from app.config import settings
+from app.etags import hierarchy_version, matches, not_modified
+from app.logger import logger
+
+# parámetros de la ruta que no forman parte de la clave
+_SKIP_PARAMS = {"db", "current_user", "request", "response"}
+
+# tags por usuario que invalidan los create_*
+FARMS_TAG = "farms:{user_id}"
+SHEDS_TAG = "sheds:{user_id}"
+DEVICES_TAG = "devices:{user_id}"
+
+
+# ---------- backends ----------
+class LocalBackend:
+    """LRU + TTL en memoria. Las versiones de los tags no caducan (son pocas)."""
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self._entries = TTLCache(max_size=max_size, ttl=ttl)
+        self._tags: dict[str, int] = defaultdict(int)
+
+    async def get(self, key: str) -> bytes | None:
+        return self._entries.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._entries.set(key, value, ttl=ttl)
+
+    async def tag_versions(self, tags: list[str]) -> list[int]:
+        return [self._tags.get(t, 0) for t in tags]
+
+    async def bump(self, tag: str) -> None:
+        self._tags[tag] += 1
+
+
+class RedisBackend:
+    def __init__(self, client: Any, prefix: str = "cerdiot:") -> None:
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBackend":
+        import redis.asyncio as redis  # dependencia opcional: solo si hay RESPONSE_CACHE_URL
+
+        return cls(redis.from_url(url))
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    async def tag_versions(self, tags: list[str]) -> list[int]:
+        values = await self.client.mget([f"{self.prefix}tag:{t}" for t in tags])
+        return [int(v) if v is not None else 0 for v in values]
+
+    async def bump(self, tag: str) -> None:
+        await self.client.incr(f"{self.prefix}tag:{tag}")
+
+
+# ---------- caché ----------
+class CacheStats:
+    def __init__(self) -> None:
+        self.hits: dict[str, int] = defaultdict(int)
+        self.misses: dict[str, int] = defaultdict(int)
+        self.errors = 0
+        self.invalidations = 0
+
+    def snapshot(self) -> dict:
+        namespaces = sorted(set(self.hits) | set(self.misses))
+        return {
+            "namespaces": {
+                ns: {"hits": self.hits[ns], "misses": self.misses[ns]} for ns in namespaces
+            },
+            "hits": sum(self.hits.values()),
+            "misses": sum(self.misses.values()),
+            "errors": self.errors,
+            "invalidations": self.invalidations,
+        }
+
+
+def _encode(response: Response) -> bytes:
+    headers = {k: v for k, v in response.headers.items() if k != "content-length"}
+    meta = json.dumps([response.status_code, response.media_type, headers])
+    return meta.encode() + b"\n" + response.body
+
+
+def _decode(raw: bytes) -> Response:
+    meta, body = raw.split(b"\n", 1)
+    status_code, media_type, headers = json.loads(meta)
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl: float) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.stats = CacheStats()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    async def invalidate(self, *tags: str) -> None:
+        for tag in tags:
+            try:
+                await self.backend.bump(tag)
+                self.stats.invalidations += 1
+            except Exception:
+                self.stats.errors += 1
+                logger.exception("Response cache invalidation failed for tag %s", tag)
+
+    async def _key(self, namespace: str, user_id: int, params: dict, tags: list[str], version) -> str:
+        versions = await self.backend.tag_versions(tags) if tags else []
+        raw = repr((sorted(params.items()), versions, version))
+        return f"resp:{namespace}:{user_id}:{hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()}"
+
+    def cached(self, namespace: str, tags: Iterable[str] = ()) -> Callable:
+        """
+        Decorador para rutas con `current_user` entre sus parámetros. Los tags
+        pueden usar {user_id} y cualquier parámetro de la ruta ({farm_id}...).
+        """
+        tag_templates = tuple(tags)
+
+        def decorator(endpoint: Callable[..., Awaitable[Any]]):
+            @functools.wraps(endpoint)
+            async def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return await endpoint(*args, **kwargs)
+
+                user_id = kwargs["current_user"].id
+                request: Request | None = kwargs.get("request")
+                params = {k: v for k, v in kwargs.items() if k not in _SKIP_PARAMS}
+                tag_names = [t.format(user_id=user_id, **params) for t in tag_templates]
+
+                # fuera del try: si falla la BBDD, falla la ruta como sin caché
+                db = kwargs.get("db")
+                version = await hierarchy_version(db, user_id) if db is not None else None
+
+                key = None
+                try:
+                    key = await self._key(namespace, user_id, params, tag_names, version)
+                    raw = await self.backend.get(key)
+                except Exception:
+                    # la caché nunca tumba la petición: se sirve sin ella
+                    self.stats.errors += 1
+                    logger.exception("Response cache lookup failed for %s", namespace)
+                    raw = None
+
+                if raw is not None:
+                    self.stats.hits[namespace] += 1
+                    response = _decode(raw)
+                    etag = response.headers.get("etag")
+                    if etag and request is not None and matches(request, etag):
+                        return not_modified(etag)
+                    return response
+
+                self.stats.misses[namespace] += 1
+                response = await endpoint(*args, **kwargs)
+                if key is not None and isinstance(response, Response) and response.status_code == 200:
+                    try:
+                        await self.backend.set(key, _encode(response), self.ttl)
+                    except Exception:
+                        self.stats.errors += 1
+                        logger.exception("Response cache store failed for %s", namespace)
+                return response
+
+            return wrapper
+
+        return decorator
+
+
+def _make_backend():
+    if settings.response_cache_url:
+        return RedisBackend.from_url(settings.response_cache_url)
+    return LocalBackend(
+        max_size=settings.response_cache_max_size,
+        ttl=settings.response_cache_ttl_seconds,
+    )
+
+
+response_cache = ResponseCache(_make_backend(), ttl=settings.response_cache_ttl_seconds)
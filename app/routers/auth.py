@@ -3,18 +3,32 @@ from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 
 from app.database import get_db
 from app import models
-from app.security import verify_password, create_access_token, get_password_hash
+from app.security import (
+    PasswordHashBusy,
+    create_access_token,
+    get_password_hash_async,
+    verify_password_async,
+)
 from app.deps import get_current_user
 from app.schemas.auth import UserPublic
 
 router = APIRouter()
 
 
+def _hash_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many login attempts in progress, retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
 class UserRegister(BaseModel):
     username: str
     password: str
@@ -23,15 +37,29 @@ class UserRegister(BaseModel):
 
 
 @router.post("/login")
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
+    user = (
+        await db.execute(
+            select(models.User.id, models.User.password_hash).where(
+                models.User.username == form_data.username
+            )
+        )
+    ).first()
     if not user:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
-
-    if not verify_password(form_data.password, user.password_hash):
+    # devolver la conexión al pool antes de hashear: con una ráfaga de logins
+    # esperando turno, si no, se quedan con todo el pool y frenan las demás rutas
+    await db.close()
+
+    # el hash es caro en CPU: en el pool de procesos, fuera del event loop
+    try:
+        valid = await verify_password_async(form_data.password, user.password_hash)
+    except PasswordHashBusy:
+        raise _hash_busy()
+    if not valid:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
 
     access_token = create_access_token({"sub": str(user.id)})
@@ -43,15 +71,15 @@ def login(
 
 
 @router.get("/me", response_model=UserPublic)
-def me(current_user: models.User = Depends(get_current_user)):
+async def me(current_user: models.User = Depends(get_current_user)):
     # devolver tal cual, con from_attributes=True no hay problema
     return current_user
 
 
 @router.post("/register", response_model=UserPublic, status_code=201)
-def register_user(
+async def register_user(
     user_in: UserRegister,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     # versión simple: solo el admin “admin” puede crear
@@ -61,17 +89,22 @@ def register_user(
             detail="Only admin can create users",
         )
 
-    existing = db.query(models.User).filter(models.User.username == user_in.username).first()
+    existing = await db.scalar(select(models.User).where(models.User.username == user_in.username))
     if existing:
         raise HTTPException(status_code=400, detail="Username already exists")
 
+    try:
+        password_hash = await get_password_hash_async(user_in.password)
+    except PasswordHashBusy:
+        raise _hash_busy()
+
     user = models.User(
         username=user_in.username,
-        password_hash=get_password_hash(user_in.password),
+        password_hash=password_hash,
         full_name=user_in.full_name or user_in.username,
         is_active=user_in.is_active,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
@@ -1,13 +1,18 @@
 # app/routers/devices.py
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import text
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app import models
 from app.deps import get_current_user
+from app.etags import bump_hierarchy_version, etag_headers, matches, not_modified, user_versions, weak_etag
+from app.fast_json import FastJSONResponse, rows_to_dicts
+from app.response_cache import DEVICES_TAG, response_cache
 from app.logger import logger
+from app.ownership import invalidate_ownership, owns_shed
+from app.telemetry_store import get_latest_by_keys
 from app.schemas.devices import (
     DeviceCreate,
     DeviceOut,
@@ -22,38 +27,45 @@ router = APIRouter(
 # así que aquí no hace falta poner prefix
 
 
+# la query del listado, también para check_indexes.py
+def devices_query(user_id: int, skip: int, limit: int):
+    # columnas sueltas en vez de objetos del ORM: se serializan directamente
+    return (
+        select(
+            models.Device.id,
+            models.Device.device_key,
+            models.Device.description,
+            models.Device.shed_id,
+        )
+        .join(models.Shed, models.Device.shed_id == models.Shed.id)
+        .join(models.Farm, models.Shed.farm_id == models.Farm.id)
+        .where(models.Farm.owner_user_id == user_id)
+        .offset(skip)
+        .limit(limit)
+    )
+
+
 @router.post(
     "/",
     response_model=DeviceOut,
     summary="Registrar un dispositivo",
     description="Crea un dispositivo en una nave del usuario. El device_key debe ser único.",
 )
-def create_device(
+async def create_device(
     device_in: DeviceCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     # 1) comprobar que el shed pertenece a una granja del usuario
-    shed = (
-        db.query(models.Shed)
-        .join(models.Farm, models.Shed.farm_id == models.Farm.id)
-        .filter(
-            models.Shed.id == device_in.shed_id,
-            models.Farm.owner_user_id == current_user.id,
-        )
-        .first()
-    )
-    if not shed:
+    if not await owns_shed(db, current_user.id, device_in.shed_id):
         logger.warning(
-            f"User {current_user.id} tried to create device in shed {device_in.shed_id} not owned"
+            "User %s tried to create device in shed %s not owned", current_user.id, device_in.shed_id
         )
         raise HTTPException(status_code=404, detail="Shed not found or not yours")
 
     # 2) comprobar que no exista ya el device_key
-    existing = (
-        db.query(models.Device)
-        .filter(models.Device.device_key == device_in.device_key)
-        .first()
+    existing = await db.scalar(
+        select(models.Device).where(models.Device.device_key == device_in.device_key)
     )
     if existing:
         raise HTTPException(status_code=400, detail="Device key already exists")
@@ -64,11 +76,14 @@ def create_device(
         description=device_in.description,
     )
     db.add(device)
-    db.commit()
-    db.refresh(device)
+    await bump_hierarchy_version(db, current_user.id)
+    await db.commit()
+    invalidate_ownership(current_user.id)
+    await response_cache.invalidate(DEVICES_TAG.format(user_id=current_user.id))
+    await db.refresh(device)
 
     logger.info(
-        f"User {current_user.id} created device id={device.id} key={device.device_key}"
+        "User %s created device id=%s key=%s", current_user.id, device.id, device.device_key
     )
     return device
 
@@ -79,86 +94,83 @@ def create_device(
     summary="Listar mis dispositivos",
     description="Devuelve los dispositivos de todas las granjas del usuario autenticado. Soporta paginación.",
 )
-def list_devices(
+@response_cache.cached("devices", tags=(DEVICES_TAG,))
+async def list_devices(
     skip: int = Query(0, ge=0, description="Registros a saltar"),
     limit: int = Query(10, ge=1, le=100, description="Número máximo de registros"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    devices = (
-        db.query(models.Device)
-        .join(models.Shed, models.Device.shed_id == models.Shed.id)
-        .join(models.Farm, models.Shed.farm_id == models.Farm.id)
-        .filter(models.Farm.owner_user_id == current_user.id)
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+    result = await db.execute(devices_query(current_user.id, skip, limit))
+    devices = result.all()
     logger.info(
-        f"User {current_user.id} listed devices skip={skip} limit={limit} -> {len(devices)} results"
+        "User %s listed devices skip=%s limit=%s -> %s results",
+        current_user.id,
+        skip,
+        limit,
+        len(devices),
+        extra={"sample_route": "/devices/"},
     )
-    return devices
+    return FastJSONResponse(rows_to_dicts(devices))
 
 
 @router.get(
     "/with-latest",
     response_model=list[DeviceWithLatestOut],
     summary="Listar dispositivos con última telemetría",
-    description="Devuelve los dispositivos del usuario junto con la última fila de la tabla telemetry para cada uno.",
+    description=(
+        "Devuelve los dispositivos del usuario junto con la última fila de la tabla telemetry "
+        "para cada uno. Devuelve `ETag`: con `If-None-Match` responde 304 si no ha cambiado nada."
+    ),
 )
-def list_devices_with_latest(
-    db: Session = Depends(get_db),
+async def list_devices_with_latest(
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
+    # 0) ETag con las versiones del usuario (una fila); si el cliente ya la tiene, 304
+    etag = weak_etag("devices-with-latest", await user_versions(db, current_user.id))
+    if matches(request, etag):
+        return not_modified(etag)
+
     # 1) sacar todos los devices del usuario
-    rows = (
-        db.query(models.Device, models.Shed, models.Farm)
+    result = await db.execute(
+        select(
+            models.Device.id,
+            models.Device.device_key,
+            models.Device.description,
+            models.Device.shed_id,
+            models.Shed.name.label("shed_name"),
+            models.Farm.id.label("farm_id"),
+            models.Farm.name.label("farm_name"),
+        )
         .join(models.Shed, models.Device.shed_id == models.Shed.id)
         .join(models.Farm, models.Shed.farm_id == models.Farm.id)
-        .filter(models.Farm.owner_user_id == current_user.id)
-        .all()
+        .where(models.Farm.owner_user_id == current_user.id)
     )
+    devices = rows_to_dicts(result.all())
 
-    result: list[DeviceWithLatestOut] = []
-
-    for device, shed, farm in rows:
-        # 2) última telemetría de este device_key
-        sql = text(
-            """
-            SELECT device_key, ts_utc, temp, hum, co2, nh3
-            FROM telemetry
-            WHERE device_key = :dk
-            ORDER BY ts_utc DESC
-            LIMIT 1
-            """
-        )
-        latest_row = db.execute(sql, {"dk": device.device_key}).fetchone()
+    # 2) última telemetría de todos los devices en UNA sola query
+    latest_by_key = await get_latest_by_keys(db, (d["device_key"] for d in devices))
 
-        if latest_row:
-            latest = {
+    for d in devices:
+        latest_row = latest_by_key.get(d["device_key"])
+        d["latest"] = (
+            {
                 "ts_utc": latest_row.ts_utc,
                 "temp": latest_row.temp,
                 "hum": latest_row.hum,
                 "co2": latest_row.co2,
                 "nh3": latest_row.nh3,
             }
-        else:
-            latest = None
-
-        result.append(
-            DeviceWithLatestOut(
-                id=device.id,
-                device_key=device.device_key,
-                description=device.description,
-                shed_id=device.shed_id,
-                shed_name=shed.name,
-                farm_id=farm.id,
-                farm_name=farm.name,
-                latest=latest,
-            )
+            if latest_row
+            else None
         )
 
     logger.info(
-        f"User {current_user.id} listed devices with latest -> {len(result)} results"
+        "User %s listed devices with latest -> %s results",
+        current_user.id,
+        len(devices),
+        extra={"sample_route": "/devices/with-latest"},
     )
-    return result
+    return FastJSONResponse(devices, headers=etag_headers(etag))
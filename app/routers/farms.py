@@ -1,40 +1,68 @@
 # app/routers/farms.py
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app import models
 from app.deps import get_current_user
+from app.etags import bump_hierarchy_version, etag_headers, hierarchy_version, matches, not_modified, weak_etag
+from app.fast_json import FastJSONResponse
 from app.logger import logger
-from app.schemas.farms import FarmCreate, FarmOut
+from app.ownership import invalidate_ownership, owns_farm
+from app.response_cache import FARMS_TAG, SHEDS_TAG, response_cache
+from app.schemas.farms import FarmCreate, FarmOut, FarmTreeOut
 from app.schemas.sheds import ShedOut  # para el endpoint de sheds
+from app.telemetry_store import get_latest_by_keys
 
 router = APIRouter()
 
 
+# las queries de los listados, también para check_indexes.py
+def farms_query(user_id: int, skip: int, limit: int):
+    return (
+        select(models.Farm.id, models.Farm.name, models.Farm.owner_user_id)
+        .where(models.Farm.owner_user_id == user_id)
+        .offset(skip)
+        .limit(limit)
+    )
+
+
+def sheds_of_farm_query(farm_id: int, skip: int, limit: int):
+    return (
+        select(models.Shed.id, models.Shed.name, models.Shed.farm_id)
+        .where(models.Shed.farm_id == farm_id)
+        .offset(skip)
+        .limit(limit)
+    )
+
+
 @router.get(
     "/",
     response_model=list[FarmOut],
     summary="Listar las granjas del usuario autenticado",
     description=(
         "Devuelve todas las granjas registradas cuyo `owner_user_id` coincide con el del usuario autenticado. "
-        "Permite paginación mediante los parámetros `skip` y `limit`."
+        "Permite paginación mediante los parámetros `skip` y `limit`. "
+        "Devuelve `ETag`: con `If-None-Match` responde 304 si no ha cambiado nada."
     ),
 )
-def list_my_farms(
+@response_cache.cached("farms", tags=(FARMS_TAG,))
+async def list_my_farms(
+    request: Request,
     skip: int = Query(0, ge=0, description="Número de registros a omitir (paginación)"),
     limit: int = Query(100, ge=1, le=500, description="Máximo número de resultados devueltos"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """Lista las granjas del usuario autenticado."""
-    farms = (
-        db.query(models.Farm)
-        .filter(models.Farm.owner_user_id == current_user.id)
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+    etag = weak_etag("farms", skip, limit, await hierarchy_version(db, current_user.id))
+    if matches(request, etag):
+        return not_modified(etag)
+
+    result = await db.execute(farms_query(current_user.id, skip, limit))
+    farms = result.all()
 
     logger.info(
         "User %s listed farms skip=%s limit=%s -> %s results",
@@ -42,8 +70,79 @@ def list_my_farms(
         skip,
         limit,
         len(farms),
+        extra={"sample_route": "/farms/"},
+    )
+    return FastJSONResponse([f._asdict() for f in farms], headers=etag_headers(etag))
+
+
+@router.get(
+    "/tree",
+    response_model=list[FarmTreeOut],
+    summary="Árbol completo granjas → naves → dispositivos",
+    description=(
+        "Devuelve toda la jerarquía del usuario autenticado en una sola respuesta "
+        "(pensado para la barra lateral). Con `include_latest=true` añade a cada "
+        "dispositivo la fecha de su última lectura."
+    ),
+)
+async def farms_tree(
+    include_latest: bool = Query(False, description="Incluir la fecha de la última lectura de cada dispositivo"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Granjas del usuario con sus naves y dispositivos."""
+    # 1 query para las granjas + 1 para naves y devices (JOIN). Las relaciones
+    # no tienen order_by, así que naves y devices se ordenan en Python
+    result = await db.execute(
+        select(models.Farm)
+        .where(models.Farm.owner_user_id == current_user.id)
+        .order_by(models.Farm.id)
+        .options(selectinload(models.Farm.sheds).joinedload(models.Shed.devices))
+    )
+    farms = result.unique().scalars().all()
+
+    latest_by_key = {}
+    if include_latest:
+        latest_by_key = await get_latest_by_keys(
+            db,
+            (d.device_key for farm in farms for shed in farm.sheds for d in shed.devices),
+        )
+
+    # dicts y no modelos: FastJSONResponse lo serializa una sola vez (con
+    # response_model FastAPI volvería a validarlo y serializarlo)
+    tree: list[dict] = []
+    for farm in farms:
+        sheds = []
+        for shed in sorted(farm.sheds, key=lambda s: s.id):
+            devices = [
+                {
+                    "id": d.id,
+                    "device_key": d.device_key,
+                    "description": d.description,
+                    "latest_ts_utc": (
+                        latest_by_key[d.device_key].ts_utc if d.device_key in latest_by_key else None
+                    ),
+                }
+                for d in sorted(shed.devices, key=lambda d: d.id)
+            ]
+            sheds.append({"id": shed.id, "name": shed.name, "device_count": len(devices), "devices": devices})
+        tree.append(
+            {
+                "id": farm.id,
+                "name": farm.name,
+                "device_count": sum(s["device_count"] for s in sheds),
+                "sheds": sheds,
+            }
+        )
+
+    logger.info(
+        "User %s loaded farms tree include_latest=%s -> %s farms",
+        current_user.id,
+        include_latest,
+        len(tree),
+        extra={"sample_route": "/farms/tree"},
     )
-    return farms
+    return FastJSONResponse(tree)
 
 
 @router.post(
@@ -55,9 +154,9 @@ def list_my_farms(
         "El campo `name` es obligatorio."
     ),
 )
-def create_farm(
+async def create_farm(
     farm_in: FarmCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """Crea una granja para el usuario autenticado."""
@@ -66,8 +165,11 @@ def create_farm(
         owner_user_id=current_user.id,
     )
     db.add(farm)
-    db.commit()
-    db.refresh(farm)
+    await bump_hierarchy_version(db, current_user.id)
+    await db.commit()
+    invalidate_ownership(current_user.id)
+    await response_cache.invalidate(FARMS_TAG.format(user_id=current_user.id))
+    await db.refresh(farm)
 
     logger.info("User %s created farm id=%s", current_user.id, farm.id)
     return farm
@@ -82,23 +184,16 @@ def create_farm(
         "Lanza un error 404 si la granja no pertenece al usuario o no existe."
     ),
 )
-def list_sheds_of_farm(
+@response_cache.cached("farm-sheds", tags=(SHEDS_TAG,))
+async def list_sheds_of_farm(
     farm_id: int,
     skip: int = Query(0, ge=0, description="Número de registros a omitir (paginación)"),
     limit: int = Query(100, ge=1, le=500, description="Máximo número de resultados devueltos"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """Lista las naves de una granja propiedad del usuario."""
-    farm = (
-        db.query(models.Farm)
-        .filter(
-            models.Farm.id == farm_id,
-            models.Farm.owner_user_id == current_user.id,
-        )
-        .first()
-    )
-    if not farm:
+    if not await owns_farm(db, current_user.id, farm_id):
         logger.warning(
             "User %s tried to list sheds of farm %s that is not his",
             current_user.id,
@@ -106,13 +201,8 @@ def list_sheds_of_farm(
         )
         raise HTTPException(status_code=404, detail="Farm not found")
 
-    sheds = (
-        db.query(models.Shed)
-        .filter(models.Shed.farm_id == farm_id)
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+    result = await db.execute(sheds_of_farm_query(farm_id, skip, limit))
+    sheds = result.all()
 
     logger.info(
         "User %s listed sheds of farm %s skip=%s limit=%s -> %s results",
@@ -121,5 +211,6 @@ def list_sheds_of_farm(
         skip,
         limit,
         len(sheds),
+        extra={"sample_route": "/farms/{farm_id}/sheds"},
     )
-    return sheds
+    return FastJSONResponse([s._asdict() for s in sheds])
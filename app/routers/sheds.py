@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import List
 
@@ -7,6 +7,10 @@ from ..database import get_db
 from .. import models
 from ..deps import get_current_user
 from ..logger import logger
+from ..fast_json import FastJSONResponse
+from ..etags import bump_hierarchy_version
+from ..ownership import invalidate_ownership, owns_farm, owns_shed
+from ..response_cache import SHEDS_TAG, response_cache
 
 router = APIRouter(
     prefix="/sheds",
@@ -38,22 +42,14 @@ class ShedOut(ShedBase):
     summary="Crear una nave",
     description="Crea una nave dentro de una granja que pertenezca al usuario autenticado.",
 )
-def create_shed(
+async def create_shed(
     shed_in: ShedCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     # comprobar que la granja es del usuario
-    farm = (
-        db.query(models.Farm)
-        .filter(
-            models.Farm.id == shed_in.farm_id,
-            models.Farm.owner_user_id == current_user.id,
-        )
-        .first()
-    )
-    if not farm:
-        logger.warning(f"User {current_user.id} tried to create shed in farm {shed_in.farm_id} not owned")
+    if not await owns_farm(db, current_user.id, shed_in.farm_id):
+        logger.warning("User %s tried to create shed in farm %s not owned", current_user.id, shed_in.farm_id)
         raise HTTPException(status_code=404, detail="Farm not found")
 
     shed = models.Shed(
@@ -61,9 +57,12 @@ def create_shed(
         farm_id=shed_in.farm_id,
     )
     db.add(shed)
-    db.commit()
-    db.refresh(shed)
-    logger.info(f"User {current_user.id} created shed id={shed.id} in farm {shed_in.farm_id}")
+    await bump_hierarchy_version(db, current_user.id)
+    await db.commit()
+    invalidate_ownership(current_user.id)
+    await response_cache.invalidate(SHEDS_TAG.format(user_id=current_user.id))
+    await db.refresh(shed)
+    logger.info("User %s created shed id=%s in farm %s", current_user.id, shed.id, shed_in.farm_id)
     return shed
 
 
@@ -73,21 +72,14 @@ def create_shed(
     summary="Obtener una nave",
     description="Devuelve una nave siempre que pertenezca a alguna granja del usuario autenticado.",
 )
-def get_shed(
+@response_cache.cached("shed", tags=(SHEDS_TAG,))
+async def get_shed(
     shed_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    shed = (
-        db.query(models.Shed)
-        .join(models.Farm, models.Shed.farm_id == models.Farm.id)
-        .filter(
-            models.Shed.id == shed_id,
-            models.Farm.owner_user_id == current_user.id,
-        )
-        .first()
-    )
+    shed = await db.get(models.Shed, shed_id) if await owns_shed(db, current_user.id, shed_id) else None
     if not shed:
-        logger.warning(f"User {current_user.id} tried to get shed {shed_id} not owned")
+        logger.warning("User %s tried to get shed %s not owned", current_user.id, shed_id)
         raise HTTPException(status_code=404, detail="Shed not found")
-    return shed
+    return FastJSONResponse({"id": shed.id, "name": shed.name, "farm_id": shed.farm_id})
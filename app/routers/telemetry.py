@@ -1,67 +1,97 @@
-from datetime import datetime
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import text
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
 
-from ..database import get_db
+from ..columnar import columnar_response, dicts_to_columns, negotiate, rows_to_columns
+from ..database import get_db, get_read_db, get_read_engine
 from .. import models
-from ..deps import get_current_user
+from ..deps import check_device_key_owned, get_current_user
+from ..etags import etag_headers, latest_version, matches, not_modified, weak_etag
+from ..fast_json import FastJSONResponse, rows_to_dicts
+from ..live import hub
 from ..logger import logger
+from ..ownership import get_ownership, owned_device_keys, owns_farm, owns_shed
+from ..partitions import partition_months
+from ..schemas.telemetry import (
+    TelemetryBatchIn,
+    TelemetryBatchOut,
+    TelemetryIn,
+    TelemetryReject,
+)
+from ..telemetry_store import (
+    AGG_BUCKETS,
+    METRICS,
+    decode_cursor,
+    device_page_query,
+    encode_cursor,
+    get_aggregates,
+    get_aligned_series,
+    get_latest,
+    get_rows_for_keys,
+    insert_readings,
+    iter_export_batches,
+)
 
 router = APIRouter()
 
+# tope de intervalos por petición en /aggregate
+MAX_AGG_BUCKETS = 10000
+
+# columnas de las respuestas por columnas (Accept: Arrow / MessagePack)
+SERIES_COLUMNS = ("ts_utc", "temp", "hum", "co2", "nh3")
+
+
+def _as_utc(dt: datetime) -> datetime:
+    # las fechas sin zona las tratamos como UTC
+    return dt if dt.tzinfo is not None else dt.replace(tzinfo=timezone.utc)
+
 
 # 1) ÚLTIMA telemetría por device_key
 @router.get(
     "/by-device-key/{device_key}",
     summary="Último dato de telemetría de un dispositivo",
-    description="Devuelve el último registro de la tabla telemetry para un device_key que sea del usuario.",
+    description=(
+        "Devuelve el último registro de la tabla telemetry para un device_key que sea del usuario. "
+        "Devuelve `ETag`: con `If-None-Match` responde 304 si no hay lecturas nuevas."
+    ),
 )
-def get_latest_by_device_key(
+async def get_latest_by_device_key(
+    request: Request,
     device_key: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
     # validar que el device es del usuario
-    device = (
-        db.query(models.Device)
-        .join(models.Shed, models.Device.shed_id == models.Shed.id)
-        .join(models.Farm, models.Shed.farm_id == models.Farm.id)
-        .filter(
-            models.Device.device_key == device_key,
-            models.Farm.owner_user_id == current_user.id,
-        )
-        .first()
-    )
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found or not yours")
-
-    sql = text(
-        """
-        SELECT id, device_key, ts_utc, temp, hum, co2, nh3
-        FROM telemetry
-        WHERE device_key = :dk
-        ORDER BY ts_utc DESC
-        LIMIT 1
-        """
-    )
-    row = db.execute(sql, {"dk": device_key}).fetchone()
-    if not row:
+    await check_device_key_owned(device_key, db, current_user)
+
+    # ETag con (ts_utc, id) de la última lectura, una fila del índice; la
+    # fila entera solo si el cliente no la tiene ya
+    version = await latest_version(db, device_key)
+    if version is None:
         raise HTTPException(status_code=404, detail="No telemetry for this device")
+    etag = weak_etag("latest", device_key, *version)
+    if matches(request, etag):
+        return not_modified(etag)
 
-    logger.info("User %s got latest telemetry for %s", current_user.id, device_key)
+    row = await get_latest(db, device_key)
+
+    logger.info(
+        "User %s got latest telemetry for %s",
+        current_user.id,
+        device_key,
+        extra={"sample_route": "/telemetry/by-device-key/{device_key}"},
+    )
 
-    return {
-        "id": row.id,
-        "device_key": row.device_key,
-        "ts_utc": row.ts_utc,
-        "temp": float(row.temp) if row.temp is not None else None,
-        "hum": float(row.hum) if row.hum is not None else None,
-        "co2": row.co2,
-        "nh3": row.nh3,
-    }
+    return FastJSONResponse(row._asdict(), headers=etag_headers(etag))
 
 
 # 2) HISTÓRICO por device_key, con filtros de fechas y límite
@@ -70,10 +100,15 @@ def get_latest_by_device_key(
     summary="Listado de telemetría",
     description=(
         "Devuelve registros de la tabla telemetry para un device_key del usuario. "
-        "Puedes filtrar por from_utc / to_utc y limitar el número de registros."
+        "Puedes filtrar por from_utc / to_utc y limitar el número de registros. "
+        "Si hay más páginas, la cabecera `X-Next-Cursor` trae el cursor que hay que "
+        "pasar en `cursor` para pedir la siguiente. Con `Accept: "
+        "application/vnd.apache.arrow.stream` o `application/x-msgpack` devuelve "
+        "ts_utc, temp, hum, co2 y nh3 como arrays por columna."
     ),
 )
-def list_telemetry(
+async def list_telemetry(
+    request: Request,
     device_key: str = Query(..., description="Clave del dispositivo"),
     from_utc: Optional[datetime] = Query(
         None, description="ISO8601 desde cuándo (UTC) ej: 2025-11-08T09:00:00Z"
@@ -82,61 +117,468 @@ def list_telemetry(
         None, description="ISO8601 hasta cuándo (UTC)"
     ),
     limit: int = Query(200, ge=1, le=2000),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(
+        None, description="Cursor opaco devuelto en X-Next-Cursor por la página anterior"
+    ),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
+    after = None
+    if cursor is not None:
+        after = decode_cursor(cursor)
+        if after is None:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
     # validar que el device es del usuario
-    device = (
-        db.query(models.Device)
-        .join(models.Shed, models.Device.shed_id == models.Shed.id)
-        .join(models.Farm, models.Shed.farm_id == models.Farm.id)
-        .filter(
-            models.Device.device_key == device_key,
-            models.Farm.owner_user_id == current_user.id,
+    await check_device_key_owned(device_key, db, current_user)
+
+    from_utc = _as_utc(from_utc) if from_utc is not None else None
+    to_utc = _as_utc(to_utc) if to_utc is not None else None
+
+    # una de más para saber si hay siguiente página
+    stmt, params = device_page_query(device_key, from_utc, to_utc, after, limit + 1)
+    rows = (await db.execute(stmt, params)).fetchall()
+    headers = {"Vary": "Accept"}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1].ts_utc, rows[-1].id)
+
+    logger.info(
+        "User %s listed telemetry for %s -> %s rows",
+        current_user.id,
+        device_key,
+        len(rows),
+        extra={"sample_route": "/telemetry/"},
+    )
+
+    fmt = negotiate(request.headers.get("accept"))
+    if fmt is not None:
+        return columnar_response(fmt, rows_to_columns(rows, SERIES_COLUMNS), headers=headers)
+    # las filas van tal cual a orjson, sin pasar por jsonable_encoder
+    return FastJSONResponse(rows_to_dicts(rows), headers=headers)
+
+
+# 3) INGESTA por lotes
+@router.post(
+    "/batch",
+    response_model=TelemetryBatchOut,
+    summary="Ingesta de telemetría por lotes",
+    description=(
+        "Recibe miles de lecturas en una sola petición (p. ej. un minuto de toda una nave). "
+        "La propiedad de los device_key se comprueba una vez por lote y las filas válidas "
+        "se escriben en bloque (COPY). Las filas inválidas, repetidas o de dispositivos ajenos se "
+        "devuelven en `rejected` sin tumbar el resto."
+    ),
+)
+async def ingest_batch(
+    batch: TelemetryBatchIn,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    rejected: list[TelemetryReject] = []
+    valid: list[tuple[int, TelemetryIn]] = []
+
+    # 1) validar fila a fila
+    for i, raw in enumerate(batch.readings):
+        try:
+            valid.append((i, TelemetryIn.model_validate(raw)))
+        except ValidationError as exc:
+            err = exc.errors()[0]
+            loc = ".".join(str(p) for p in err.get("loc", ()))
+            rejected.append(
+                TelemetryReject(
+                    index=i,
+                    device_key=raw.get("device_key") if isinstance(raw, dict) else None,
+                    reason=f"{loc}: {err.get('msg')}" if loc else err.get("msg", "invalid"),
+                )
+            )
+
+    # 2) propiedad de los device_key: UNA query para todo el lote
+    keys = {r.device_key for _, r in valid}
+    owned = await owned_device_keys(db, current_user.id, keys) if keys else set()
+
+    # 3) que haya partición para su mes: si no, el COPY falla entero
+    months = await partition_months(db)
+
+    to_insert: list[dict] = []
+    insert_index: list[int] = []  # índice en el lote de cada fila de to_insert
+    for i, r in valid:
+        if r.device_key not in owned:
+            rejected.append(
+                TelemetryReject(index=i, device_key=r.device_key, reason="Device not found or not yours")
+            )
+            continue
+        ts_utc = _as_utc(r.ts_utc).astimezone(timezone.utc)
+        if months is not None:
+            month = ts_utc.date().replace(day=1)
+            if month not in months:
+                rejected.append(
+                    TelemetryReject(
+                        index=i,
+                        device_key=r.device_key,
+                        reason=f"ts_utc: outside the stored range (no partition for {month:%Y-%m})",
+                    )
+                )
+                continue
+        to_insert.append({**r.model_dump(), "ts_utc": ts_utc})
+        insert_index.append(i)
+
+    # 4) escritura en bloque
+    inserted, skipped = await insert_readings(db, to_insert)
+    await db.commit()
+    for pos in skipped:
+        rejected.append(
+            TelemetryReject(
+                index=insert_index[pos],
+                device_key=to_insert[pos]["device_key"],
+                reason="Duplicate reading: (device_key, ts_utc) already stored",
+            )
         )
-        .first()
+
+    rejected.sort(key=lambda rej: rej.index)
+    logger.info(
+        "User %s ingested telemetry batch -> %s inserted, %s rejected",
+        current_user.id,
+        inserted,
+        len(rejected),
     )
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found or not yours")
+    return TelemetryBatchOut(
+        received=len(batch.readings),
+        inserted=inserted,
+        rejected=rejected,
+    )
+
 
-    sql = """
-        SELECT id, device_key, ts_utc, temp, hum, co2, nh3
-        FROM telemetry
-        WHERE device_key = :dk
-    """
-    params = {"dk": device_key}
+# 4) AGREGADOS por intervalo (para gráficas)
+@router.get(
+    "/aggregate",
+    summary="Telemetría agregada por intervalos",
+    description=(
+        "Agrupa la telemetría de un device_key del usuario en intervalos de `bucket` "
+        "(1m, 5m, 1h, 1d) y devuelve avg, min, max, last y count por métrica. "
+        "El cálculo lo hace la base de datos, así una gráfica de un mes son unos "
+        "cientos de filas. Por defecto, las últimas 24 horas. Acepta los mismos "
+        "formatos por columnas que `GET /telemetry/` (Arrow / MessagePack)."
+    ),
+)
+async def aggregate_telemetry(
+    request: Request,
+    device_key: str = Query(..., description="Clave del dispositivo"),
+    bucket: str = Query("1h", pattern="^(1m|5m|1h|1d)$", description="Tamaño del intervalo"),
+    metrics: Optional[List[str]] = Query(
+        None, description="Métricas a devolver (temp, hum, co2, nh3). Por defecto todas."
+    ),
+    from_utc: Optional[datetime] = Query(None, description="ISO8601 desde cuándo (UTC)"),
+    to_utc: Optional[datetime] = Query(None, description="ISO8601 hasta cuándo (UTC), excluido"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    if metrics:
+        unknown = set(metrics) - set(METRICS)
+        if unknown:
+            raise HTTPException(
+                status_code=400, detail=f"Unknown metrics: {', '.join(sorted(unknown))}"
+            )
+    else:
+        metrics = list(METRICS)
 
-    if from_utc is not None:
-        sql += " AND ts_utc >= :from_utc"
-        params["from_utc"] = from_utc
-    if to_utc is not None:
-        sql += " AND ts_utc <= :to_utc"
-        params["to_utc"] = to_utc
+    bucket_seconds = AGG_BUCKETS[bucket]
+    to_utc = _as_utc(to_utc) if to_utc is not None else datetime.now(timezone.utc)
+    from_utc = _as_utc(from_utc) if from_utc is not None else to_utc - timedelta(days=1)
+    if from_utc >= to_utc:
+        raise HTTPException(status_code=400, detail="from_utc must be before to_utc")
+    if (to_utc - from_utc).total_seconds() / bucket_seconds > MAX_AGG_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many buckets (max {MAX_AGG_BUCKETS}), use a bigger bucket",
+        )
 
-    sql += " ORDER BY ts_utc DESC"
-    sql += " LIMIT :limit"
-    params["limit"] = limit
+    await check_device_key_owned(device_key, db, current_user)
 
-    rows = db.execute(text(sql), params).fetchall()
+    out = await get_aggregates(db, device_key, bucket_seconds, from_utc, to_utc, metrics)
 
     logger.info(
-        "User %s listed telemetry for %s -> %s rows",
+        "User %s aggregated telemetry for %s bucket=%s -> %s buckets",
         current_user.id,
         device_key,
-        len(rows),
+        bucket,
+        len(out),
+        extra={"sample_route": "/telemetry/aggregate"},
     )
+    fmt = negotiate(request.headers.get("accept"))
+    if fmt is not None:
+        names = ["bucket", "count"] + [
+            f"{m}_{stat}" for m in METRICS if m in metrics for stat in ("avg", "min", "max", "last", "count")
+        ]
+        return columnar_response(fmt, dicts_to_columns(out, names))
+    return FastJSONResponse(out, headers={"Vary": "Accept"})
 
-    out: List[dict] = []
-    for r in rows:
-        out.append(
-            {
-                "id": r.id,
-                "device_key": r.device_key,
-                "ts_utc": r.ts_utc,
-                "temp": float(r.temp) if r.temp is not None else None,
-                "hum": float(r.hum) if r.hum is not None else None,
-                "co2": r.co2,
-                "nh3": r.nh3,
-            }
+
+# 5) EXPORTACIÓN en streaming (NDJSON / CSV)
+EXPORT_COLUMNS = ("id", "device_key", "ts_utc", "temp", "hum", "co2", "nh3")
+
+
+def _export_value(v):
+    if isinstance(v, datetime):
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return float(v)
+    return v
+
+
+async def _iter_ndjson(batches):
+    async for batch in batches:
+        yield "".join(
+            json.dumps({c: _export_value(getattr(r, c)) for c in EXPORT_COLUMNS}) + "\n"
+            for r in batch
         )
-    return out
+
+
+async def _iter_csv(batches):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    async for batch in batches:
+        for r in batch:
+            writer.writerow([_export_value(getattr(r, c)) for c in EXPORT_COLUMNS])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+@router.get(
+    "/export",
+    summary="Exportar telemetría (streaming)",
+    description=(
+        "Exporta la telemetría de un device_key o de todos los dispositivos de una nave "
+        "del usuario, en NDJSON o CSV. Las filas salen en streaming desde un cursor de "
+        "servidor, así que exportar un año entero usa memoria constante."
+    ),
+)
+async def export_telemetry(
+    device_key: Optional[str] = Query(None, description="Clave del dispositivo"),
+    shed_id: Optional[int] = Query(None, description="Exportar todos los dispositivos de esta nave"),
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    from_utc: Optional[datetime] = Query(None, description="ISO8601 desde cuándo (UTC)"),
+    to_utc: Optional[datetime] = Query(None, description="ISO8601 hasta cuándo (UTC)"),
+    db: AsyncSession = Depends(get_read_db),
+    auth_db: AsyncSession = Depends(get_db),  # la misma sesión que usa get_current_user
+    current_user: models.User = Depends(get_current_user),
+):
+    if (device_key is None) == (shed_id is None):
+        raise HTTPException(status_code=400, detail="Use exactly one of device_key or shed_id")
+
+    if device_key is not None:
+        await check_device_key_owned(device_key, db, current_user)
+        keys = [device_key]
+        name = device_key
+    else:
+        if not await owns_shed(db, current_user.id, shed_id):
+            raise HTTPException(status_code=404, detail="Shed not found")
+        keys = list((await get_ownership(db, current_user.id)).keys_by_shed.get(shed_id, ()))
+        name = f"shed-{shed_id}"
+    # el volcado va por su propia conexión (iter_export_batches): las sesiones
+    # de la petición no se cerrarían hasta acabar el stream, así que se
+    # devuelven ya al pool
+    await db.close()
+    await auth_db.close()
+
+    logger.info(
+        "User %s exported telemetry %s format=%s (%s devices)",
+        current_user.id,
+        name,
+        fmt,
+        len(keys),
+    )
+
+    from_utc = _as_utc(from_utc) if from_utc is not None else None
+    to_utc = _as_utc(to_utc) if to_utc is not None else None
+    batches = iter_export_batches(keys, from_utc, to_utc, bind=get_read_engine())
+    if fmt == "csv":
+        body, media_type = _iter_csv(batches), "text/csv"
+    else:
+        body, media_type = _iter_ndjson(batches), "application/x-ndjson"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="telemetry-{name}.{fmt}"'},
+    )
+
+
+# 6) TIEMPO REAL (Server-Sent Events)
+STREAM_KEEPALIVE_SECONDS = 15
+
+
+async def _resolve_stream_keys(
+    device_key: List[str] = Query([], description="device_key a seguir (repetible)"),
+    shed_id: List[int] = Query([], description="Naves a seguir (repetible)"),
+    farm_id: List[int] = Query([], description="Granjas a seguir (repetible)"),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+) -> list[str]:
+    # se resuelve una sola vez al suscribirse, no por cada lectura
+    ownership = await get_ownership(db, current_user.id)
+    if device_key or shed_id or farm_id:
+        wanted = set(device_key)
+        for sid in shed_id:
+            wanted.update(ownership.keys_by_shed.get(sid, ()))
+        for fid in farm_id:
+            wanted.update(ownership.keys_by_farm.get(fid, ()))
+        keys = sorted(await owned_device_keys(db, current_user.id, wanted))
+    else:
+        keys = sorted(ownership.device_keys)
+    if not keys:
+        raise HTTPException(status_code=404, detail="No devices to subscribe to")
+    # la sesión (la misma que usa get_current_user) no se cerraría hasta acabar
+    # el stream: devolver ya la conexión al pool en vez de tenerla idle in
+    # transaction mientras el dashboard siga abierto
+    await db.close()
+
+    logger.info("User %s subscribed to live telemetry for %s devices", current_user.id, len(keys))
+    return keys
+
+
+@router.get(
+    "/stream",
+    summary="Telemetría en directo (SSE)",
+    description=(
+        "Abre un flujo Server-Sent Events con las lecturas nuevas de los dispositivos "
+        "indicados (device_key, shed_id y/o farm_id, repetibles). Sin filtros, todos los "
+        "dispositivos del usuario. Sustituye al polling de /by-device-key y /devices/with-latest."
+    ),
+)
+async def stream_telemetry(
+    request: Request,
+    keys: list[str] = Depends(_resolve_stream_keys),
+):
+    queue = hub.subscribe(keys)
+
+    async def events():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    reading = await asyncio.wait_for(queue.get(), STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: telemetry\ndata: {json.dumps(reading)}\n\n"
+        finally:
+            hub.unsubscribe(keys, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# 7) TELEMETRÍA de una nave / granja entera en una sola petición
+async def _group_telemetry(
+    db: AsyncSession,
+    keys: list[str],
+    from_utc: Optional[datetime],
+    to_utc: Optional[datetime],
+    limit: int,
+    align: Optional[str],
+    metrics: Optional[List[str]],
+) -> dict:
+    to_utc = _as_utc(to_utc) if to_utc is not None else datetime.now(timezone.utc)
+    from_utc = _as_utc(from_utc) if from_utc is not None else to_utc - timedelta(days=1)
+    if from_utc >= to_utc:
+        raise HTTPException(status_code=400, detail="from_utc must be before to_utc")
+
+    if align is not None:
+        if metrics and set(metrics) - set(METRICS):
+            raise HTTPException(status_code=400, detail="Unknown metrics")
+        bucket_seconds = AGG_BUCKETS[align]
+        if (to_utc - from_utc).total_seconds() / bucket_seconds > MAX_AGG_BUCKETS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many buckets (max {MAX_AGG_BUCKETS}), use a bigger bucket",
+            )
+        buckets, series = await get_aligned_series(
+            db, keys, bucket_seconds, from_utc, to_utc, metrics or METRICS
+        )
+        return {"bucket": align, "buckets": buckets, "series": series}
+
+    devices: dict[str, list[dict]] = {dk: [] for dk in keys}
+    rows, truncated = await get_rows_for_keys(db, keys, from_utc, to_utc, limit)
+    for r in rows:
+        devices[r.device_key].append(r._asdict())
+    # dispositivos con más de `limit` filas en el rango: se han devuelto las más recientes
+    return {"from_utc": from_utc, "to_utc": to_utc, "devices": devices, "truncated": sorted(truncated)}
+
+
+@router.get(
+    "/by-shed/{shed_id}",
+    summary="Telemetría de todos los dispositivos de una nave",
+    description=(
+        "Devuelve la telemetría de todos los dispositivos de una nave del usuario en una "
+        "sola consulta, agrupada por device_key. Con `align` devuelve series alineadas "
+        "(media por intervalo) en un eje de tiempos común. Por defecto, últimas 24 horas. "
+        "Sin `align` devuelve como mucho `limit` filas por dispositivo, las más recientes; "
+        "los que tienen más en el rango salen en `truncated`."
+    ),
+)
+async def telemetry_by_shed(
+    shed_id: int,
+    from_utc: Optional[datetime] = Query(None, description="ISO8601 desde cuándo (UTC)"),
+    to_utc: Optional[datetime] = Query(None, description="ISO8601 hasta cuándo (UTC)"),
+    limit: int = Query(5000, ge=1, le=20000, description="Máximo de filas por dispositivo (sin align)"),
+    align: Optional[str] = Query(None, pattern="^(1m|5m|1h|1d)$", description="Alinear en intervalos"),
+    metrics: Optional[List[str]] = Query(None, description="Métricas para align (por defecto todas)"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    if not await owns_shed(db, current_user.id, shed_id):
+        raise HTTPException(status_code=404, detail="Shed not found")
+    keys = list((await get_ownership(db, current_user.id)).keys_by_shed.get(shed_id, ()))
+
+    out = await _group_telemetry(db, keys, from_utc, to_utc, limit, align, metrics)
+    logger.info(
+        "User %s listed telemetry of shed %s -> %s devices",
+        current_user.id,
+        shed_id,
+        len(keys),
+        extra={"sample_route": "/telemetry/by-shed/{shed_id}"},
+    )
+    return FastJSONResponse(out)
+
+
+@router.get(
+    "/by-farm/{farm_id}",
+    summary="Telemetría de todos los dispositivos de una granja",
+    description=(
+        "Igual que /by-shed pero para todos los dispositivos de todas las naves de una "
+        "granja del usuario."
+    ),
+)
+async def telemetry_by_farm(
+    farm_id: int,
+    from_utc: Optional[datetime] = Query(None, description="ISO8601 desde cuándo (UTC)"),
+    to_utc: Optional[datetime] = Query(None, description="ISO8601 hasta cuándo (UTC)"),
+    limit: int = Query(5000, ge=1, le=20000, description="Máximo de filas por dispositivo (sin align)"),
+    align: Optional[str] = Query(None, pattern="^(1m|5m|1h|1d)$", description="Alinear en intervalos"),
+    metrics: Optional[List[str]] = Query(None, description="Métricas para align (por defecto todas)"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    if not await owns_farm(db, current_user.id, farm_id):
+        raise HTTPException(status_code=404, detail="Farm not found")
+    keys = list((await get_ownership(db, current_user.id)).keys_by_farm.get(farm_id, ()))
+
+    out = await _group_telemetry(db, keys, from_utc, to_utc, limit, align, metrics)
+    logger.info(
+        "User %s listed telemetry of farm %s -> %s devices",
+        current_user.id,
+        farm_id,
+        len(keys),
+        extra={"sample_route": "/telemetry/by-farm/{farm_id}"},
+    )
+    return FastJSONResponse(out)
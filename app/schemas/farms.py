@@ -1,4 +1,6 @@
 # app/schemas/farms.py
+from datetime import datetime
+
 from pydantic import BaseModel
 
 
@@ -17,3 +19,25 @@ class FarmOut(FarmBase):
 
     class Config:
         from_attributes = True  # antes orm_mode
+
+
+# ------- árbol granja → naves → devices para GET /farms/tree -------
+class DeviceNode(BaseModel):
+    id: int
+    device_key: str
+    description: str | None = None
+    latest_ts_utc: datetime | None = None  # solo con include_latest=true
+
+
+class ShedNode(BaseModel):
+    id: int
+    name: str
+    device_count: int
+    devices: list[DeviceNode]
+
+
+class FarmTreeOut(BaseModel):
+    id: int
+    name: str
+    device_count: int
+    sheds: list[ShedNode]
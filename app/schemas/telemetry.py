@@ -1,5 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
+from typing import Any
 
 
 class TelemetryBase(BaseModel):
@@ -16,3 +17,27 @@ class TelemetryOut(TelemetryBase):
 
     class Config:
         from_attributes = True
+
+
+# ------- ingesta por lotes (/telemetry/batch) -------
+class TelemetryIn(TelemetryBase):
+    """Una lectura tal y como la manda el gateway."""
+    pass
+
+
+class TelemetryBatchIn(BaseModel):
+    # las filas se validan una a una en el router para poder rechazar
+    # solo las malas sin tumbar el lote entero
+    readings: list[dict[str, Any]] = Field(..., min_length=1, max_length=10000)
+
+
+class TelemetryReject(BaseModel):
+    index: int
+    device_key: str | None = None
+    reason: str
+
+
+class TelemetryBatchOut(BaseModel):
+    received: int
+    inserted: int
+    rejected: list[TelemetryReject] = []
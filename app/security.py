@@ -1,7 +1,13 @@
 # /opt/iot-backend/app/security.py
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Callable, Optional, TypeVar
 
+from fastapi.concurrency import run_in_threadpool
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 
@@ -20,6 +26,102 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+# --------- PASSWORDS FUERA DEL WORKER ----------
+# pbkdf2 es caro a propósito. En el threadpool compartido, una ráfaga de logins
+# se come la CPU del worker y frena todas las demás rutas; en un pool de
+# procesos acotado se queda en PASSWORD_HASH_WORKERS núcleos. Como mucho
+# PASSWORD_HASH_CONCURRENCY hashes a la vez por worker: el resto espera turno
+# hasta PASSWORD_HASH_QUEUE_TIMEOUT y si no, PasswordHashBusy (-> 503).
+T = TypeVar("T")
+
+_hash_pool: ProcessPoolExecutor | None = None
+_hash_slots: asyncio.Semaphore | None = None
+
+
+class PasswordHashBusy(Exception):
+    """No ha quedado hueco para hashear antes del timeout de la cola."""
+
+
+def _init_hash_process(nice: int) -> None:
+    # menos prioridad que los workers de la API: si no sobra CPU, que esperen los logins
+    if nice and hasattr(os, "nice"):
+        os.nice(nice)
+
+
+def _get_hash_pool() -> ProcessPoolExecutor:
+    global _hash_pool
+    if _hash_pool is None:
+        # spawn y no fork: el worker tiene hilos (logs, asyncpg) y fork los copia a medias
+        _hash_pool = ProcessPoolExecutor(
+            max_workers=settings.password_hash_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_hash_process,
+            initargs=(settings.password_hash_nice,),
+        )
+    return _hash_pool
+
+
+def _warmup() -> int:
+    # carga el handler de pbkdf2 en el proceso (passlib lo hace perezoso)
+    pwd_context.handler()
+    return os.getpid()
+
+
+def start_hash_pool() -> None:
+    """
+    Arranca los procesos ya (al arrancar la API), no en el primer login. El
+    pool solo lanza un proceso por submit si no tiene ninguno libre, así que
+    N tareas seguidas (antes de que arranque ninguno) levantan los N.
+    """
+    if settings.password_hash_workers > 0:
+        pool = _get_hash_pool()
+        for _ in range(settings.password_hash_workers):
+            pool.submit(_warmup)
+
+
+def shutdown_hash_pool() -> None:
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = None
+
+
+async def _run_hash(fn: Callable[..., T], *args) -> T:
+    global _hash_pool, _hash_slots
+    if _hash_slots is None:
+        _hash_slots = asyncio.Semaphore(settings.password_hash_concurrency)
+    # asyncio.timeout y no wait_for: en 3.11 wait_for puede dar timeout justo
+    # cuando el acquire ya ha cogido el hueco, y ese hueco no se devuelve nunca
+    acquired = False
+    try:
+        async with asyncio.timeout(settings.password_hash_queue_timeout):
+            await _hash_slots.acquire()
+            acquired = True
+    except TimeoutError:
+        if acquired:
+            _hash_slots.release()
+        raise PasswordHashBusy() from None
+    try:
+        if settings.password_hash_workers <= 0:
+            return await run_in_threadpool(fn, *args)  # como antes
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_hash_pool(), fn, *args)
+    except BrokenProcessPool:
+        # algún proceso murió (OOM...): el siguiente login crea un pool nuevo
+        _hash_pool = None
+        raise
+    finally:
+        _hash_slots.release()
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hash(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_hash(get_password_hash, password)
+
+
 # --------- TOKENS ----------
 def create_access_token(data: dict, expires_minutes: Optional[int] = None) -> str:
     """
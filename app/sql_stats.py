@@ -0,0 +1,115 @@
+# app/sql_stats.py
+"""
+Instrumentación SQL por petición: nº de sentencias, tiempo en BBDD y detector
+de N+1 (la misma sentencia ejecutada muchas veces en una sola petición).
+
+Se activa con SQL_STATS_ENABLED=true. Los hooks de SQLAlchemy solo suman a un
+objeto guardado en un ContextVar, así que el coste por query es mínimo. El
+resultado sale en la cabecera `Server-Timing` y en el log cuando la petición
+es lenta en BBDD o huele a N+1.
+"""
+from __future__ import annotations
+
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+from app.logger import logger
+
+_current: ContextVar["RequestSQLStats | None"] = ContextVar("sql_stats", default=None)
+
+
+class RequestSQLStats:
+    __slots__ = ("count", "db_time", "shapes")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.db_time = 0.0
+        self.shapes: Counter[str] = Counter()
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.db_time * 1000:.1f};desc="{self.count} queries"'
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """Sentencias que se han repetido más de `threshold` veces."""
+        return [(sql, n) for sql, n in self.shapes.most_common() if n > threshold]
+
+
+def current_sql_stats() -> RequestSQLStats | None:
+    return _current.get()
+
+
+# ---------- hooks de SQLAlchemy ----------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("sql_stats_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    starts = conn.info.get("sql_stats_start")
+    if starts:
+        stats.db_time += time.perf_counter() - starts.pop()
+    stats.count += 1
+    # la sentencia ya viene parametrizada, así que el texto es la "forma"
+    stats.shapes[" ".join(statement.split())] += 1
+
+
+def install_sql_hooks() -> None:
+    """Engancha los hooks a todos los Engine (primario, réplicas, sync y async)."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ---------- middleware ASGI ----------
+class SQLStatsMiddleware:
+    def __init__(self, app, n_plus_one_threshold: int = 10, slow_db_ms: float = 500) -> None:
+        self.app = app
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.slow_db_ms = slow_db_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestSQLStats()
+        token = _current.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("Server-Timing", stats.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self._report(scope, stats)
+
+    def _report(self, scope, stats: RequestSQLStats) -> None:
+        method, path = scope.get("method"), scope.get("path")
+        for sql, n in stats.repeated(self.n_plus_one_threshold):
+            logger.warning(
+                "Possible N+1 on %s %s: statement ran %s times: %.200s",
+                method,
+                path,
+                n,
+                sql,
+            )
+        db_ms = stats.db_time * 1000
+        if db_ms >= self.slow_db_ms:
+            logger.info(
+                "Slow DB on %s %s: %s queries, %.1f ms in DB",
+                method,
+                path,
+                stats.count,
+                db_ms,
+            )
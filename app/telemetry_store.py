@@ -0,0 +1,469 @@
+# app/telemetry_store.py
+"""
+Consultas SQL sobre la tabla `telemetry` (que vive fuera del ORM).
+
+Aquí juntamos las queries "gordas" de telemetría para que los routers
+no tengan que repetir SQL a mano.
+"""
+from __future__ import annotations
+
+import base64
+import math
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Iterable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app.config import settings
+from app.database import async_engine
+
+
+# Una sola query para N dispositivos: por cada device_key hacemos un
+# LATERAL con LIMIT 1, que con el índice (device_key, ts_utc) es un
+# index seek por clave. El coste crece con el nº de claves, no con el
+# tamaño de la tabla, y es un único round trip.
+LATEST_BY_KEYS_SQL = text(
+    """
+    SELECT t.id, t.device_key, t.ts_utc, t.temp, t.hum, t.co2, t.nh3
+    FROM unnest(CAST(:keys AS text[])) AS k(device_key)
+    CROSS JOIN LATERAL (
+        SELECT id, device_key, ts_utc, temp, hum, co2, nh3
+        FROM telemetry
+        WHERE telemetry.device_key = k.device_key
+        ORDER BY ts_utc DESC
+        LIMIT 1
+    ) AS t
+    """
+)
+
+
+async def get_latest_by_keys(db: AsyncSession, device_keys: Iterable[str]) -> dict:
+    """
+    Devuelve {device_key: fila} con la última telemetría de cada clave.
+    Las claves sin datos simplemente no aparecen en el dict.
+    """
+    keys = list(dict.fromkeys(device_keys))  # sin duplicados, mismo orden
+    if not keys:
+        return {}
+
+    rows = (await db.execute(LATEST_BY_KEYS_SQL, {"keys": keys})).fetchall()
+    return {r.device_key: r for r in rows}
+
+
+async def get_latest(db: AsyncSession, device_key: str):
+    """Última fila de telemetría de un device_key (o None)."""
+    return (await get_latest_by_keys(db, [device_key])).get(device_key)
+
+
+# ---------- paginación por cursor (keyset) ----------
+def encode_cursor(ts_utc: datetime, row_id: int) -> str:
+    """Cursor opaco a partir de (ts_utc, id) de la última fila de la página."""
+    raw = f"{ts_utc.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int] | None:
+    """Devuelve (ts_utc, id) o None si el cursor no es válido."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts_raw, id_raw = base64.urlsafe_b64decode(padded).decode().split("|", 1)
+        return datetime.fromisoformat(ts_raw), int(id_raw)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def device_page_query(
+    device_key: str,
+    from_utc: datetime | None,
+    to_utc: datetime | None,
+    after: tuple[datetime, int] | None,
+    limit: int,
+):
+    """(sentencia, parámetros) de una página de GET /telemetry/, de más nueva a más vieja."""
+    params: dict = {"dk": device_key, "limit": limit}
+    sql = """
+        SELECT id, device_key, ts_utc, temp, hum, co2, nh3
+        FROM telemetry
+        WHERE device_key = :dk
+    """
+    sql += _range_filters(params, from_utc, to_utc)
+    if after is not None:
+        # keyset: seguimos justo después de la última fila de la página anterior,
+        # sin OFFSET, así la página 500 cuesta lo mismo que la 1
+        sql += " AND (ts_utc, id) < (:after_ts, :after_id)"
+        params["after_ts"], params["after_id"] = after
+    sql += " ORDER BY ts_utc DESC, id DESC LIMIT :limit"
+    return text(sql), params
+
+
+# ---------- agregación por intervalos ----------
+AGG_BUCKETS = {"1m": 60, "5m": 300, "1h": 3600, "1d": 86400}
+METRICS = ("temp", "hum", "co2", "nh3")
+
+
+def _aggregate_sql(metrics: Iterable[str]) -> str:
+    # los nombres de métrica vienen de METRICS (lista blanca), no del usuario
+    cols = []
+    for m in metrics:
+        cols += [
+            f"avg({m}) AS {m}_avg",
+            f"min({m}) AS {m}_min",
+            f"max({m}) AS {m}_max",
+            f"(array_agg({m} ORDER BY ts_utc DESC) FILTER (WHERE {m} IS NOT NULL))[1] AS {m}_last",
+            f"count({m}) AS {m}_count",
+        ]
+    return f"""
+        SELECT
+            to_timestamp(floor(extract(epoch FROM ts_utc) / CAST(:secs AS integer)) * CAST(:secs AS integer)) AS bucket,
+            count(*) AS count,
+            {", ".join(cols)}
+        FROM telemetry
+        WHERE device_key = :dk
+          AND ts_utc >= :from_utc
+          AND ts_utc < :to_utc
+        GROUP BY 1
+        ORDER BY 1
+    """
+
+
+# rollups mantenidos por trigger (ver migración c4d81f5e2b90)
+ROLLUP_TABLES = {3600: "telemetry_1h", 86400: "telemetry_1d"}
+
+
+def _rollup_sql(table: str, metrics: Iterable[str]) -> str:
+    cols = []
+    for m in metrics:
+        cols += [
+            f"{m}_sum / NULLIF({m}_count, 0) AS {m}_avg",
+            f"{m}_min",
+            f"{m}_max",
+            f"{m}_last",
+            f"{m}_count",
+        ]
+    return f"""
+        SELECT bucket, n AS count, {", ".join(cols)}
+        FROM {table}
+        WHERE device_key = :dk
+          AND bucket >= :from_utc
+          AND bucket < :to_utc
+        ORDER BY bucket
+    """
+
+
+def _format_aggregates(rows, metrics: list[str]) -> list[dict]:
+    out: list[dict] = []
+    for r in rows:
+        item = {"bucket": r["bucket"], "count": r["count"]}
+        for m in metrics:
+            for stat in ("avg", "min", "max", "last"):
+                v = r[f"{m}_{stat}"]
+                item[f"{m}_{stat}"] = float(v) if v is not None else None
+            item[f"{m}_count"] = r[f"{m}_count"]
+        out.append(item)
+    return out
+
+
+async def _query_aggregates(db: AsyncSession, sql: str, params: dict, metrics: list[str]) -> list[dict]:
+    result = await db.execute(text(sql), params)
+    return _format_aggregates(result.mappings().all(), metrics)
+
+
+def _align(dt: datetime, bucket_seconds: int, up: bool) -> datetime:
+    """Redondea al borde de intervalo (en UTC) hacia arriba o hacia abajo."""
+    ts = dt.timestamp()
+    edge = (math.ceil if up else math.floor)(ts / bucket_seconds) * bucket_seconds
+    return datetime.fromtimestamp(edge, tz=timezone.utc)
+
+
+async def get_aggregates(
+    db: AsyncSession,
+    device_key: str,
+    bucket_seconds: int,
+    from_utc: datetime,
+    to_utc: datetime,
+    metrics: Iterable[str] = METRICS,
+) -> list[dict]:
+    """
+    avg/min/max/last/count por intervalo y métrica, calculado en Postgres.
+    Devuelve una lista de dicts planos ({"bucket", "count", "temp_avg", ...}).
+
+    Para 1h y 1d los intervalos completos salen de los rollups; solo los
+    trozos de los bordes (intervalos a medias) se calculan sobre telemetry.
+    """
+    metrics = [m for m in METRICS if m in set(metrics)]
+    raw_sql = _aggregate_sql(metrics)
+
+    async def raw(start: datetime, end: datetime) -> list[dict]:
+        params = {"dk": device_key, "secs": bucket_seconds, "from_utc": start, "to_utc": end}
+        return await _query_aggregates(db, raw_sql, params, metrics)
+
+    table = ROLLUP_TABLES.get(bucket_seconds) if settings.telemetry_use_rollups else None
+    if table is None:
+        return await raw(from_utc, to_utc)
+
+    full_from = _align(from_utc, bucket_seconds, up=True)
+    full_to = _align(to_utc, bucket_seconds, up=False)
+    if full_from >= full_to:
+        return await raw(from_utc, to_utc)
+
+    out: list[dict] = []
+    if from_utc < full_from:
+        out += await raw(from_utc, full_from)
+    out += await _query_aggregates(
+        db,
+        _rollup_sql(table, metrics),
+        {"dk": device_key, "from_utc": full_from, "to_utc": full_to},
+        metrics,
+    )
+    if full_to < to_utc:
+        out += await raw(full_to, to_utc)
+    return out
+
+
+# ---------- varios dispositivos a la vez (naves / granjas) ----------
+def _range_filters(params: dict, from_utc: datetime | None, to_utc: datetime | None) -> str:
+    sql = ""
+    if from_utc is not None:
+        sql += " AND ts_utc >= :from_utc"
+        params["from_utc"] = from_utc
+    if to_utc is not None:
+        sql += " AND ts_utc <= :to_utc"
+        params["to_utc"] = to_utc
+    return sql
+
+
+def rows_for_keys_query(
+    device_keys: list[str],
+    from_utc: datetime | None,
+    to_utc: datetime | None,
+    limit: int,
+):
+    """(sentencia, parámetros) de get_rows_for_keys: `limit` filas por clave."""
+    params: dict = {"keys": device_keys, "limit": limit}
+    sql = """
+        SELECT t.id, t.device_key, t.ts_utc, t.temp, t.hum, t.co2, t.nh3
+        FROM unnest(CAST(:keys AS text[])) AS k(device_key)
+        CROSS JOIN LATERAL (
+            SELECT id, device_key, ts_utc, temp, hum, co2, nh3
+            FROM telemetry
+            WHERE telemetry.device_key = k.device_key
+    """
+    sql += _range_filters(params, from_utc, to_utc)
+    sql += """
+            ORDER BY ts_utc DESC, id DESC
+            LIMIT :limit
+        ) AS t
+    """
+    return text(sql), params
+
+
+async def get_rows_for_keys(
+    db: AsyncSession,
+    device_keys: list[str],
+    from_utc: datetime | None,
+    to_utc: datetime | None,
+    limit: int,
+) -> tuple[list, set[str]]:
+    """
+    Telemetría de varios device_key en UNA query, las `limit` más recientes de
+    CADA uno (LATERAL por clave, como LATEST_BY_KEYS_SQL): un dispositivo que
+    manda mucho no deja sin filas a los demás. Devuelve (filas, claves que se
+    han quedado en el límite y tienen más).
+    """
+    # una de más por clave para saber si hay más
+    stmt, params = rows_for_keys_query(device_keys, from_utc, to_utc, limit + 1)
+    rows, counts = [], defaultdict(int)
+    for r in (await db.execute(stmt, params)).fetchall():
+        counts[r.device_key] += 1
+        if counts[r.device_key] <= limit:
+            rows.append(r)
+    return rows, {dk for dk, n in counts.items() if n > limit}
+
+
+async def get_aligned_series(
+    db: AsyncSession,
+    device_keys: list[str],
+    bucket_seconds: int,
+    from_utc: datetime,
+    to_utc: datetime,
+    metrics: Iterable[str] = METRICS,
+) -> tuple[list[datetime], dict[str, dict[str, list]]]:
+    """
+    Media por intervalo de cada device_key, alineadas al mismo eje de tiempos.
+    Devuelve (buckets, {device_key: {métrica: [valor o None por bucket]}}).
+    """
+    metrics = [m for m in METRICS if m in set(metrics)]
+    sql = f"""
+        SELECT
+            device_key,
+            to_timestamp(floor(extract(epoch FROM ts_utc) / CAST(:secs AS integer)) * CAST(:secs AS integer)) AS bucket,
+            {", ".join(f"avg({m}) AS {m}" for m in metrics)}
+        FROM telemetry
+        WHERE device_key = ANY(CAST(:keys AS text[]))
+          AND ts_utc >= :from_utc
+          AND ts_utc < :to_utc
+        GROUP BY 1, 2
+        ORDER BY 2
+    """
+    result = await db.execute(
+        text(sql),
+        {"keys": device_keys, "secs": bucket_seconds, "from_utc": from_utc, "to_utc": to_utc},
+    )
+    rows = result.mappings().all()
+
+    buckets = sorted({r["bucket"] for r in rows})
+    pos = {b: i for i, b in enumerate(buckets)}
+    series = {dk: {m: [None] * len(buckets) for m in metrics} for dk in device_keys}
+    for r in rows:
+        i = pos[r["bucket"]]
+        for m in metrics:
+            v = r[m]
+            series[r["device_key"]][m][i] = float(v) if v is not None else None
+    return buckets, series
+
+
+# ---------- exportación en streaming ----------
+EXPORT_FETCH_SIZE = 5000
+
+EXPORT_SQL = """
+    SELECT id, device_key, ts_utc, temp, hum, co2, nh3
+    FROM telemetry
+    WHERE device_key = ANY(CAST(:keys AS text[]))
+"""
+
+
+def export_query(device_keys: list[str], from_utc: datetime | None, to_utc: datetime | None):
+    """(sentencia, parámetros) del volcado de iter_export_batches."""
+    # los filtros de fecha se añaden solo si vienen, para que el planner pueda
+    # descartar particiones (con un "IS NULL OR ..." no puede)
+    params: dict = {"keys": device_keys}
+    sql = EXPORT_SQL + _range_filters(params, from_utc, to_utc)
+    sql += " ORDER BY ts_utc, device_key"
+    return text(sql), params
+
+
+async def iter_export_batches(
+    device_keys: list[str],
+    from_utc: datetime | None = None,
+    to_utc: datetime | None = None,
+    fetch_size: int = EXPORT_FETCH_SIZE,
+    bind: AsyncEngine | None = None,
+):
+    """
+    Va soltando la telemetría en lotes de `fetch_size` filas usando un cursor
+    de servidor (AsyncConnection.stream), así la memoria no crece con el rango.
+
+    Abre su propia conexión: el generador vive más que la sesión de la
+    petición (lo consume el StreamingResponse).
+    """
+    stmt, params = export_query(device_keys, from_utc, to_utc)
+
+    async with (bind or async_engine).connect() as conn:
+        result = await conn.stream(stmt, params)
+        async for batch in result.partitions(fetch_size):
+            yield batch
+
+
+# ---------- escritura masiva ----------
+TELEMETRY_COLUMNS = ("device_key", "ts_utc", "temp", "hum", "co2", "nh3")
+
+# tabla temporal de la conexión: las lecturas se cargan aquí (con COPY si se
+# puede) y de aquí pasan a telemetry con ON CONFLICT DO NOTHING, así una
+# lectura repetida (con el índice único ux_telemetry_device_key_ts_utc) se
+# salta sola en vez de tumbar el lote
+STAGE_TABLE = "telemetry_stage"
+
+CREATE_STAGE_SQL = text(
+    f"""
+    CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} (
+        idx INTEGER NOT NULL,
+        device_key VARCHAR(100) NOT NULL,
+        ts_utc TIMESTAMPTZ NOT NULL,
+        temp DOUBLE PRECISION,
+        hum DOUBLE PRECISION,
+        co2 INTEGER,
+        nh3 INTEGER
+    )
+    """
+)
+
+STAGE_INSERT_SQL = text(
+    f"""
+    INSERT INTO {STAGE_TABLE} (idx, device_key, ts_utc, temp, hum, co2, nh3)
+    VALUES (:idx, :device_key, :ts_utc, :temp, :hum, :co2, :nh3)
+    """
+)
+
+# devuelve la posición (idx) de las filas que no han entrado. Con repetidas
+# dentro del propio lote entra la primera: sobran las de rn > insertadas.
+MERGE_STAGE_SQL = text(
+    f"""
+    WITH ins AS (
+        INSERT INTO telemetry (device_key, ts_utc, temp, hum, co2, nh3)
+        SELECT device_key, ts_utc, temp, hum, co2, nh3
+        FROM {STAGE_TABLE}
+        ORDER BY idx
+        ON CONFLICT DO NOTHING
+        RETURNING device_key, ts_utc
+    ),
+    done AS (
+        SELECT device_key, ts_utc, count(*) AS n FROM ins GROUP BY device_key, ts_utc
+    ),
+    staged AS (
+        SELECT idx, device_key, ts_utc,
+               row_number() OVER (PARTITION BY device_key, ts_utc ORDER BY idx) AS rn
+        FROM {STAGE_TABLE}
+    )
+    SELECT s.idx
+    FROM staged s
+    LEFT JOIN done d ON d.device_key = s.device_key AND d.ts_utc = s.ts_utc
+    WHERE s.rn > COALESCE(d.n, 0)
+    ORDER BY s.idx
+    """
+)
+
+TRUNCATE_STAGE_SQL = text(f"TRUNCATE {STAGE_TABLE}")
+
+
+async def _copy_rows(db: AsyncSession, rows: list[dict]) -> bool:
+    """
+    Carga `rows` en la tabla temporal con COPY (copy_records_to_table de
+    asyncpg) sobre la conexión de la sesión. Devuelve False si el driver no
+    lo soporta, para cargarla con un INSERT normal.
+    """
+    conn = await db.connection()
+    raw = (await conn.get_raw_connection()).driver_connection
+    if not hasattr(raw, "copy_records_to_table"):
+        return False
+    # el adaptador de SQLAlchemy abre la transacción con la primera sentencia
+    # que pasa por la sesión, no antes: fuera de ella el COPY se confirmaría
+    # solo y la carga no iría en el mismo commit que el resto del lote
+    if not raw.is_in_transaction():
+        raise RuntimeError("COPY fuera de la transacción de la sesión")
+
+    await raw.copy_records_to_table(
+        STAGE_TABLE,
+        records=[(i, *(r[c] for c in TELEMETRY_COLUMNS)) for i, r in enumerate(rows)],
+        columns=["idx", *TELEMETRY_COLUMNS],
+    )
+    return True
+
+
+async def insert_readings(db: AsyncSession, rows: list[dict]) -> tuple[int, list[int]]:
+    """
+    Inserta muchas lecturas de golpe pasando por la tabla temporal (COPY si el
+    driver lo permite y si no un executemany). Devuelve (insertadas,
+    posiciones en `rows` de las repetidas que se han saltado). Todo va en la
+    transacción de la sesión y no hace commit: eso es cosa del router.
+    """
+    if not rows:
+        return 0, []
+    # va por la sesión a propósito: así queda abierta la transacción antes del COPY
+    await db.execute(CREATE_STAGE_SQL)
+    if not await _copy_rows(db, rows):
+        await db.execute(STAGE_INSERT_SQL, [{"idx": i, **r} for i, r in enumerate(rows)])
+    skipped = list((await db.execute(MERGE_STAGE_SQL)).scalars())
+    await db.execute(TRUNCATE_STAGE_SQL)
+    return len(rows) - len(skipped), skipped
@@ -0,0 +1,110 @@
+# /opt/iot-backend/bench_compression.py
+"""
+Bytes en el cable y CPU de comprimir respuestas típicas de telemetría con
+cada nivel de gzip y brotli (los mismos compresores que usa el middleware).
+
+    python bench_compression.py
+    python bench_compression.py --rows 5000 --repeat 50
+
+Payloads: una página de GET /telemetry/ en JSON y el mismo volumen exportado
+en CSV y NDJSON. "stream" es NDJSON en trozos de 500 filas con flush en cada
+trozo, como sale /telemetry/export.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BASE_DIR)
+
+from app.compression import _Gzip, _Brotli, brotli  # noqa
+
+COLUMNS = ("id", "device_key", "ts_utc", "temp", "hum", "co2", "nh3")
+STREAM_CHUNK_ROWS = 500
+
+
+def _rows(n: int) -> list[dict]:
+    rnd = random.Random(42)
+    now = datetime(2026, 10, 17, tzinfo=timezone.utc)
+    temp, hum, co2, nh3 = 21.0, 65.0, 900, 10
+    out = []
+    for i in range(n):
+        temp += rnd.uniform(-0.2, 0.2)
+        hum += rnd.uniform(-0.5, 0.5)
+        co2 += rnd.randint(-15, 15)
+        nh3 = max(0, nh3 + rnd.randint(-1, 1))
+        out.append(
+            {
+                "id": 1_500_000 - i,
+                "device_key": "nave3-sensor-07",
+                "ts_utc": (now - timedelta(seconds=30 * i)).isoformat(),
+                "temp": round(temp, 2),
+                "hum": round(hum, 1),
+                "co2": co2,
+                "nh3": nh3,
+            }
+        )
+    return out
+
+
+def _payloads(rows: list[dict]) -> dict[str, list[bytes]]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(COLUMNS)
+    for r in rows:
+        writer.writerow([r[c] for c in COLUMNS])
+    ndjson_lines = [json.dumps(r) + "\n" for r in rows]
+    return {
+        "json": [json.dumps(rows, separators=(",", ":")).encode()],
+        "csv": [buf.getvalue().encode()],
+        "ndjson": ["".join(ndjson_lines).encode()],
+        "stream": [
+            "".join(ndjson_lines[i : i + STREAM_CHUNK_ROWS]).encode()
+            for i in range(0, len(ndjson_lines), STREAM_CHUNK_ROWS)
+        ],
+    }
+
+
+def _compress(make, chunks: list[bytes]) -> bytes:
+    c = make()
+    if len(chunks) == 1:
+        return c.finish(chunks[0])
+    return b"".join(c.chunk(ch) for ch in chunks) + c.finish()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de compresión de respuestas")
+    parser.add_argument("--rows", type=int, default=2000, help="Filas por respuesta")
+    parser.add_argument("--repeat", type=int, default=20, help="Repeticiones por medida")
+    args = parser.parse_args()
+
+    encoders = [(f"gzip-{lvl}", lambda lvl=lvl: _Gzip(lvl)) for lvl in (1, 3, 6, 9)]
+    if brotli is not None:
+        encoders += [(f"br-{q}", lambda q=q: _Brotli(q)) for q in (1, 4, 6, 9, 11)]
+    else:
+        print("(brotli no instalado: solo gzip)\n")
+
+    for name, chunks in _payloads(_rows(args.rows)).items():
+        raw = sum(len(c) for c in chunks)
+        print(f"{name}: {raw / 1024:.1f} KiB sin comprimir ({args.rows} filas)")
+        print(f"  {'encoder':<9} {'bytes':>9} {'ratio':>7} {'ms CPU':>8} {'us/fila':>8}")
+        for label, make in encoders:
+            start = time.process_time()
+            for _ in range(args.repeat):
+                out = _compress(make, chunks)
+            cpu = (time.process_time() - start) / args.repeat
+            print(
+                f"  {label:<9} {len(out):>9} {raw / len(out):>6.1f}x "
+                f"{cpu * 1000:>8.2f} {cpu / args.rows * 1e6:>8.2f}"
+            )
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# /opt/iot-backend/bench_login_storm.py
+"""
+Latencia de una ruta de telemetría mientras llueven logins.
+
+Dos fases contra una API ya levantada: primero solo la ruta de telemetría
+(referencia) y después la misma carga con --storm clientes haciendo POST
+/auth/login sin parar. Saca p50/p95/p99 de la telemetría en cada fase.
+
+    python bench_login_storm.py --username admin --password ... --device-key nave3-sensor-07
+
+Para comparar antes/después, lanzar la API con un solo worker y correrlo dos
+veces: con PASSWORD_HASH_WORKERS=0 (hash en el threadpool, como antes) y con
+el pool de procesos (por defecto).
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+def _pct(values: list[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def _probe(client: httpx.AsyncClient, path: str, headers: dict, until: float, out: list[float]):
+    while time.perf_counter() < until:
+        start = time.perf_counter()
+        r = await client.get(path, headers=headers)
+        out.append(time.perf_counter() - start)
+        r.raise_for_status()
+
+
+async def _login_loop(client: httpx.AsyncClient, form: dict, until: float, codes: dict[int, int]):
+    while time.perf_counter() < until:
+        r = await client.post("/auth/login", data=form)
+        codes[r.status_code] = codes.get(r.status_code, 0) + 1
+
+
+async def _phase(client, args, path, headers, storm: int) -> tuple[list[float], dict[int, int]]:
+    until = time.perf_counter() + args.duration
+    latencies: list[float] = []
+    codes: dict[int, int] = {}
+    form = {"username": args.username, "password": args.password}
+    await asyncio.gather(
+        *(_probe(client, path, headers, until, latencies) for _ in range(args.probes)),
+        *(_login_loop(client, form, until, codes) for _ in range(storm)),
+    )
+    return latencies, codes
+
+
+async def run(client: httpx.AsyncClient, args) -> None:
+    r = await client.post("/auth/login", data={"username": args.username, "password": args.password})
+    r.raise_for_status()
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    path = args.path.format(device_key=args.device_key)
+
+    print(f"{path}: {args.probes} clientes, {args.duration:.0f}s por fase")
+    print(f"  {'fase':<16} {'peticiones':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}  logins")
+    for label, storm in (("sin logins", 0), (f"{args.storm} x login", args.storm)):
+        latencies, codes = await _phase(client, args, path, headers, storm)
+        ms = [v * 1000 for v in latencies]
+        logins = ", ".join(f"{code}: {n}" for code, n in sorted(codes.items())) or "-"
+        print(
+            f"  {label:<16} {len(ms):>10} {_pct(ms, 0.5):>8.1f} {_pct(ms, 0.95):>8.1f} "
+            f"{_pct(ms, 0.99):>8.1f} {max(ms, default=float('nan')):>8.1f}  {logins}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="p99 de telemetría durante una tormenta de logins")
+    parser.add_argument("--url", default="http://localhost:8000", help="URL base de la API")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--device-key", required=True, help="Dispositivo del usuario a consultar")
+    parser.add_argument(
+        "--path",
+        default="/telemetry/by-device-key/{device_key}",
+        help="Ruta de telemetría a medir ({device_key} se sustituye)",
+    )
+    parser.add_argument("--probes", type=int, default=4, help="Clientes concurrentes sobre la ruta")
+    parser.add_argument("--storm", type=int, default=32, help="Clientes concurrentes haciendo login")
+    parser.add_argument("--duration", type=float, default=15, help="Segundos por fase")
+    args = parser.parse_args()
+
+    async def _main():
+        limits = httpx.Limits(max_connections=args.probes + args.storm + 1)
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+            await run(client, args)
+
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
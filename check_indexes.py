@@ -0,0 +1,137 @@
+# /opt/iot-backend/check_indexes.py
+"""
+Comprueba con EXPLAIN qué plan usan las queries calientes de los routers y si
+tiran de índice (Index Only Scan / Index Scan) o se van a Seq Scan.
+
+    python check_indexes.py                   # con el primer usuario con granjas
+    python check_indexes.py --user-id 3
+    python check_indexes.py --analyze         # EXPLAIN ANALYZE (ejecuta las queries)
+
+Usa datos reales de la BBDD (un usuario, una granja y sus device_key) para
+que los planes sean los de verdad. Sale con código 1 si alguna query cae en
+Seq Scan sobre farms, sheds, devices o telemetry.
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BASE_DIR)
+
+from sqlalchemy import text  # noqa
+from sqlalchemy.sql.elements import TextClause  # noqa
+
+from app.database import engine  # noqa
+from app.ownership import ownership_query  # noqa
+from app.routers.devices import devices_query  # noqa
+from app.routers.farms import farms_query, sheds_of_farm_query  # noqa
+from app.telemetry_store import (  # noqa
+    LATEST_BY_KEYS_SQL,
+    METRICS,
+    _aggregate_sql,
+    _rollup_sql,
+    device_page_query,
+    export_query,
+    rows_for_keys_query,
+)
+
+HOT_TABLES = ("farms", "sheds", "devices", "telemetry")
+INDEX_NODES = ("Index Only Scan", "Index Scan", "Bitmap Index Scan")
+
+
+def _queries(user_id: int, farm_id: int, shed_id: int, keys: list[str]) -> list[tuple[str, object, dict]]:
+    # las mismas sentencias que ejecutan los routers (no copias), con los
+    # parámetros por defecto de cada ruta
+    now = datetime.now(timezone.utc)
+    day_ago = now - timedelta(days=1)
+    dk = keys[0]
+    return [
+        ("ownership index (deps / ownership.py)", ownership_query(user_id), {}),
+        ("GET /farms/", farms_query(user_id, 0, 100), {}),
+        ("GET /farms/{id}/sheds", sheds_of_farm_query(farm_id, 0, 100), {}),
+        ("GET /devices/", devices_query(user_id, 0, 10), {}),
+        ("latest by keys (/devices/with-latest)", LATEST_BY_KEYS_SQL, {"keys": keys}),
+        ("GET /telemetry/ (keyset page)", *device_page_query(dk, None, None, (now, 2**62), 201)),
+        ("GET /telemetry/by-shed (range)", *rows_for_keys_query(keys, day_ago, now, 5001)),
+        ("GET /telemetry/export (range)", *export_query(keys, day_ago, now)),
+        (
+            "GET /telemetry/aggregate (raw)",
+            text(_aggregate_sql(METRICS)),
+            {"dk": dk, "secs": 300, "from_utc": day_ago, "to_utc": now},
+        ),
+        (
+            "GET /telemetry/aggregate (rollup 1h)",
+            text(_rollup_sql("telemetry_1h", METRICS)),
+            {"dk": dk, "from_utc": day_ago, "to_utc": now},
+        ),
+    ]
+
+
+def _scans(plan: dict) -> list[tuple[str, str, str | None]]:
+    """(tipo de nodo, tabla, índice) de cada nodo de lectura del plan."""
+    out = []
+    if "Relation Name" in plan or "Index Name" in plan:
+        out.append((plan["Node Type"], plan.get("Relation Name", ""), plan.get("Index Name")))
+    for child in plan.get("Plans", []):
+        out += _scans(child)
+    return out
+
+
+def _pick_sample(conn, user_id: int | None) -> tuple[int, int, int, list[str]]:
+    sql = """
+        SELECT f.owner_user_id, f.id, s.id, array_agg(d.device_key)
+        FROM farms f
+        JOIN sheds s ON s.farm_id = f.id
+        JOIN devices d ON d.shed_id = s.id
+        {where}
+        GROUP BY 1, 2, 3
+        ORDER BY count(*) DESC
+        LIMIT 1
+    """
+    if user_id is None:
+        row = conn.execute(text(sql.format(where=""))).first()
+    else:
+        row = conn.execute(text(sql.format(where="WHERE f.owner_user_id = :uid")), {"uid": user_id}).first()
+    if row is None:
+        sys.exit("No hay ningún usuario con granja → nave → dispositivo para probar")
+    return row[0], row[1], row[2], list(row[3])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Qué índices usan las queries calientes")
+    parser.add_argument("--user-id", type=int, default=None, help="Usuario cuyos datos se usan")
+    parser.add_argument("--analyze", action="store_true", help="EXPLAIN ANALYZE en vez de solo EXPLAIN")
+    args = parser.parse_args()
+
+    explain = "EXPLAIN (ANALYZE, FORMAT JSON)" if args.analyze else "EXPLAIN (FORMAT JSON)"
+    seq_scans = 0
+
+    with engine.connect() as conn:
+        user_id, farm_id, shed_id, keys = _pick_sample(conn, args.user_id)
+        print(f"user_id={user_id} farm_id={farm_id} shed_id={shed_id} device_keys={len(keys)}\n")
+
+        for label, stmt, params in _queries(user_id, farm_id, shed_id, keys):
+            if not isinstance(stmt, TextClause):
+                # las del ORM se compilan con los valores ya metidos en el SQL
+                stmt = text(str(stmt.compile(engine, compile_kwargs={"literal_binds": True})))
+            raw = conn.execute(text(f"{explain} {stmt.text}"), params).scalar()
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+
+            print(label)
+            for node, table, index in _scans(plan):
+                bad = node == "Seq Scan" and table.split("_y")[0] in HOT_TABLES
+                seq_scans += bad
+                mark = "OK " if node in INDEX_NODES else ("!! " if bad else "   ")
+                print(f"  {mark}{node:<18} {table:<22} {index or ''}")
+            print()
+        conn.rollback()
+
+    if seq_scans:
+        print(f"{seq_scans} Seq Scan sobre tablas calientes")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
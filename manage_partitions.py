@@ -0,0 +1,52 @@
+# /opt/iot-backend/manage_partitions.py
+"""
+Mantenimiento de particiones de telemetry. Pensado para un cron diario:
+
+    python manage_partitions.py                  # crea los próximos meses
+    python manage_partitions.py --retain 24      # y desengancha lo de hace más de 2 años
+    python manage_partitions.py --retain 24 --drop
+"""
+import argparse
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BASE_DIR)
+
+from app.database import engine  # noqa
+from app.config import settings  # noqa
+from app.partitions import detach_old_partitions, ensure_partitions  # noqa
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantenimiento de particiones de telemetry")
+    parser.add_argument(
+        "--ahead",
+        type=int,
+        default=settings.telemetry_partitions_ahead,
+        help="Meses por delante a tener creados",
+    )
+    parser.add_argument(
+        "--retain",
+        type=int,
+        default=settings.telemetry_retention_months,
+        help="Meses a conservar; los anteriores se desenganchan (sin valor: no se toca nada)",
+    )
+    parser.add_argument(
+        "--drop",
+        action="store_true",
+        help="Borrar las particiones desenganchadas en vez de dejarlas como tablas sueltas",
+    )
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        created = ensure_partitions(conn, args.ahead)
+        print(f"Created: {', '.join(created) or '-'}")
+
+        if args.retain is not None:
+            detached = detach_old_partitions(conn, args.retain, drop=args.drop)
+            print(f"{'Dropped' if args.drop else 'Detached'}: {', '.join(detached) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+# app.config exige estas variables; los tests no tocan la BBDD de verdad
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET_KEY", "test")
+# el log de los tests no va al logs/app.log del repo
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="cerdiot-test-logs-"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def pg_engine():
+    """Engine (síncrono) contra TEST_POSTGRES_URL, con `alembic upgrade head` hecho."""
+    url = os.environ.get("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL no definida")
+    engine = create_engine(url, poolclass=NullPool)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def pg_telemetry_unique(pg_engine):
+    """Salta si la base no tiene ux_telemetry_device_key_ts_utc (-x telemetry_unique=true)."""
+    with pg_engine.connect() as conn:
+        if not conn.execute(text("SELECT to_regclass('ux_telemetry_device_key_ts_utc') IS NOT NULL")).scalar():
+            pytest.skip("sin ux_telemetry_device_key_ts_utc")
+
+
+@pytest.fixture
+def pg_hierarchy(pg_engine):
+    """
+    Usuario -> granja -> nave -> dispositivo de usar y tirar (más una granja
+    huérfana, owner_user_id NULL, con su propio dispositivo). Se borra todo al
+    acabar, telemetría incluida.
+    """
+    tag = uuid.uuid4().hex[:12]
+    with pg_engine.begin() as conn:
+        user_id = conn.execute(
+            text("INSERT INTO users (username, password_hash) VALUES (:u, 'x') RETURNING id"),
+            {"u": f"test-{tag}"},
+        ).scalar_one()
+        keys, sheds = {}, {}
+        for owner, label in ((user_id, "owned"), (None, "orphan")):
+            farm_id = conn.execute(
+                text("INSERT INTO farms (name, owner_user_id) VALUES (:n, :o) RETURNING id"),
+                {"n": f"farm-{tag}", "o": owner},
+            ).scalar_one()
+            shed_id = conn.execute(
+                text("INSERT INTO sheds (name, farm_id) VALUES (:n, :f) RETURNING id"),
+                {"n": f"shed-{tag}", "f": farm_id},
+            ).scalar_one()
+            keys[label], sheds[label] = f"test-{label}-{tag}", shed_id
+            conn.execute(
+                text("INSERT INTO devices (device_key, shed_id) VALUES (:k, :s)"),
+                {"k": keys[label], "s": shed_id},
+            )
+    yield SimpleNamespace(
+        user_id=user_id,
+        tag=tag,
+        farm_name=f"farm-{tag}",
+        shed_id=sheds["owned"],
+        device_key=keys["owned"],
+        orphan_key=keys["orphan"],
+    )
+    with pg_engine.begin() as conn:
+        for table in ("telemetry", "telemetry_1h", "telemetry_1d"):
+            conn.execute(text(f"DELETE FROM {table} WHERE device_key LIKE :k"), {"k": f"test-%-{tag}"})
+        conn.execute(text("DELETE FROM devices WHERE device_key LIKE :k"), {"k": f"test-%-{tag}"})
+        conn.execute(text("DELETE FROM sheds WHERE name = :n"), {"n": f"shed-{tag}"})
+        conn.execute(text("DELETE FROM farms WHERE name = :n"), {"n": f"farm-{tag}"})
+        conn.execute(text("DELETE FROM users WHERE id = :id"), {"id": user_id})
+
+
+@pytest.fixture
+def pg_client(pg_hierarchy, monkeypatch):
+    """
+    TestClient con los routers de granjas, dispositivos y telemetría contra
+    TEST_POSTGRES_URL (asyncpg), autenticado como el usuario de pg_hierarchy.
+    Esa base hace de primario y de réplica.
+    """
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from sqlalchemy import make_url
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from app import ownership
+    from app.database import get_db, get_read_db
+    from app.deps import get_current_user
+    from app.routers import devices, farms, telemetry
+
+    url = make_url(os.environ["TEST_POSTGRES_URL"]).set(drivername="postgresql+asyncpg")
+    engine = create_async_engine(url, poolclass=NullPool)
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def session():
+        async with Session() as db:
+            yield db
+
+    monkeypatch.setattr(ownership, "async_engine", engine)
+    monkeypatch.setattr(telemetry, "get_read_engine", lambda: engine)
+    user = SimpleNamespace(id=pg_hierarchy.user_id)
+
+    app = FastAPI()
+    app.include_router(farms.router, prefix="/farms")
+    app.include_router(devices.router, prefix="/devices")
+    app.include_router(telemetry.router, prefix="/telemetry")
+    app.dependency_overrides[get_db] = session
+    app.dependency_overrides[get_read_db] = session
+    app.dependency_overrides[get_current_user] = lambda: user
+    ownership.invalidate_ownership(user.id)
+    with TestClient(app) as client:
+        yield client
+    ownership.invalidate_ownership(user.id)
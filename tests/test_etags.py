@@ -0,0 +1,75 @@
+# tests/test_etags.py
+"""
+ETags contra Postgres (TEST_POSTGRES_URL): el trigger de telemetry sube
+telemetry_version del dueño una vez por sentencia (las lecturas de granjas
+sin dueño no lo rompen), y /farms/ y /devices/with-latest dejan de dar 304
+en cuanto cambia lo que devuelven.
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+INSERT_READING = text("INSERT INTO telemetry (device_key, ts_utc, temp) VALUES (:k, :ts, 20.0)")
+
+
+def _versions(conn, user_id: int):
+    return conn.execute(
+        text("SELECT hierarchy_version, telemetry_version FROM etag_versions WHERE user_id = :id"),
+        {"id": user_id},
+    ).one_or_none()
+
+
+def test_telemetry_insert_bumps_owner_once_per_statement(pg_engine, pg_hierarchy):
+    ts = datetime.now(timezone.utc).replace(microsecond=0)
+    with pg_engine.begin() as conn:
+        assert _versions(conn, pg_hierarchy.user_id) is None
+        conn.execute(
+            text(
+                "INSERT INTO telemetry (device_key, ts_utc, temp) "
+                "VALUES (:k, :ts, 20.0), (:k, :ts2, 21.0)"
+            ),
+            {"k": pg_hierarchy.device_key, "ts": ts, "ts2": ts + timedelta(seconds=1)},
+        )
+    with pg_engine.begin() as conn:
+        assert _versions(conn, pg_hierarchy.user_id) == (0, 1)
+        conn.execute(INSERT_READING, {"k": pg_hierarchy.device_key, "ts": ts + timedelta(seconds=2)})
+    with pg_engine.connect() as conn:
+        assert _versions(conn, pg_hierarchy.user_id) == (0, 2)
+
+
+def test_telemetry_insert_for_ownerless_farm(pg_engine, pg_hierarchy):
+    ts = datetime.now(timezone.utc).replace(microsecond=0)
+    with pg_engine.begin() as conn:
+        before = conn.execute(text("SELECT count(*) FROM etag_versions")).scalar_one()
+        conn.execute(INSERT_READING, {"k": pg_hierarchy.orphan_key, "ts": ts})
+    with pg_engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM etag_versions")).scalar_one() == before
+        assert conn.execute(
+            text("SELECT count(*) FROM telemetry WHERE device_key = :k"), {"k": pg_hierarchy.orphan_key}
+        ).scalar_one() == 1
+
+
+def test_farms_etag_changes_after_create(pg_client, pg_hierarchy):
+    first = pg_client.get("/farms/")
+    etag = first.headers["etag"]
+    assert pg_client.get("/farms/", headers={"If-None-Match": etag}).status_code == 304
+
+    created = pg_client.post("/farms/", json={"name": pg_hierarchy.farm_name})
+    assert created.status_code == 200
+
+    after = pg_client.get("/farms/", headers={"If-None-Match": etag})
+    assert after.status_code == 200
+    assert created.json()["id"] in {f["id"] for f in after.json()}
+
+
+def test_devices_with_latest_etag_changes_with_telemetry(pg_engine, pg_client, pg_hierarchy):
+    etag = pg_client.get("/devices/with-latest").headers["etag"]
+    assert pg_client.get("/devices/with-latest", headers={"If-None-Match": etag}).status_code == 304
+
+    with pg_engine.begin() as conn:
+        conn.execute(INSERT_READING, {"k": pg_hierarchy.device_key, "ts": datetime.now(timezone.utc)})
+
+    after = pg_client.get("/devices/with-latest", headers={"If-None-Match": etag})
+    assert after.status_code == 200
+    latest = {d["device_key"]: d["latest"] for d in after.json()}
+    assert latest[pg_hierarchy.device_key]["temp"] == 20.0
@@ -0,0 +1,128 @@
+# tests/test_live.py
+"""
+El hub de /telemetry/stream: una NOTIFY que entra por la conexión LISTEN
+tiene que llegar a la cola del suscriptor.
+
+Sin Postgres a mano, la conexión del driver es una falsa (imita lo que usa
+_listen de psycopg2: autocommit, cursor, poll, notifies y fileno para el
+select), pero pasa por un Engine y un pool de SQLAlchemy de verdad, que es
+donde estaba el fallo de detach(). Con TEST_POSTGRES_URL=postgresql://...
+se prueba además contra Postgres.
+"""
+import asyncio
+import json
+import os
+import socket
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from app.live import CHANNEL, TelemetryHub
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = None
+
+    def execute(self, sql, *args):
+        self.conn.executed.append(sql)
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FakePGConnection:
+    """Lo justo de una conexión psycopg2 para LISTEN/NOTIFY."""
+
+    def __init__(self):
+        self._r, self._w = socket.socketpair()
+        self.autocommit = False
+        self.notifies: list = []
+        self.executed: list[str] = []
+        self._pending: list = []
+
+    def fileno(self):
+        return self._r.fileno()
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def poll(self):
+        self._r.recv(4096)
+        self.notifies.extend(self._pending)
+        self._pending.clear()
+
+    def notify(self, payload: str):
+        self._pending.append(SimpleNamespace(channel=CHANNEL, payload=payload))
+        self._w.send(b"x")
+
+    def create_function(self, *args, **kwargs):  # lo registra el dialecto sqlite al conectar
+        pass
+
+    def rollback(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self._r.close()
+        self._w.close()
+
+
+async def _receive(hub: TelemetryHub, notify, device_key: str) -> dict:
+    queue = hub.subscribe([device_key])
+    try:
+        # reintenta la NOTIFY hasta que el hilo haya hecho LISTEN
+        for _ in range(50):
+            notify(json.dumps({"device_key": device_key, "temp": 21.5}))
+            try:
+                return await asyncio.wait_for(queue.get(), 0.2)
+            except asyncio.TimeoutError:
+                continue
+        raise AssertionError("the subscriber never got the notification")
+    finally:
+        hub.unsubscribe([device_key], queue)
+        hub.stop()
+
+
+def test_notify_reaches_subscriber():
+    pg = FakePGConnection()
+    bind = create_engine("sqlite://", creator=lambda: pg, poolclass=NullPool)
+    hub = TelemetryHub(bind=bind)
+
+    reading = asyncio.run(_receive(hub, pg.notify, "nave1-sensor-01"))
+
+    assert reading == {"device_key": "nave1-sensor-01", "temp": 21.5}
+    assert pg.autocommit is True
+    assert f"LISTEN {CHANNEL}" in pg.executed
+
+
+@pytest.mark.skipif(not os.environ.get("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL no definida")
+def test_notify_reaches_subscriber_postgres():
+    bind = create_engine(os.environ["TEST_POSTGRES_URL"], poolclass=NullPool)
+    hub = TelemetryHub(bind=bind)
+
+    def notify(payload: str) -> None:
+        with bind.connect() as conn:
+            conn.execute(text("SELECT pg_notify(:ch, :payload)"), {"ch": CHANNEL, "payload": payload})
+            conn.commit()
+
+    reading = asyncio.run(_receive(hub, notify, "nave1-sensor-01"))
+
+    assert reading["temp"] == 21.5
@@ -0,0 +1,56 @@
+# tests/test_ownership.py
+"""
+Índice de propiedad contra Postgres (TEST_POSTGRES_URL): un id ajeno solo
+cuesta mirar hierarchy_version, y un alta de otro worker (que sube la
+versión sin invalidar este índice) se ve sin esperar al TTL.
+"""
+import asyncio
+import os
+
+from sqlalchemy import event, make_url, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app import ownership
+from app.etags import BUMP_HIERARCHY_SQL
+
+
+def test_missing_ids_check_version_before_rebuilding(pg_engine, pg_hierarchy, monkeypatch):
+    url = make_url(os.environ["TEST_POSTGRES_URL"]).set(drivername="postgresql+asyncpg")
+    engine = create_async_engine(url, poolclass=NullPool)
+    # que la sesión del test cuente como la del primario
+    monkeypatch.setattr(ownership, "async_engine", engine)
+    Session = async_sessionmaker(engine)
+
+    statements: list[str] = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda c, cur, sql, *a: statements.append(sql))
+    user_id = pg_hierarchy.user_id
+    ownership.invalidate_ownership(user_id)
+
+    async def main():
+        async with Session() as db:
+            farm_id = next(iter((await ownership.get_ownership(db, user_id)).farm_ids))
+            assert await ownership.owns_farm(db, user_id, farm_id)
+
+            statements.clear()
+            for _ in range(3):
+                assert not await ownership.owns_farm(db, user_id, -1)
+            assert len(statements) == 3
+            assert all("etag_versions" in sql for sql in statements)
+
+        # alta desde "otro worker"
+        with pg_engine.begin() as conn:
+            new_farm = conn.execute(
+                text("INSERT INTO farms (name, owner_user_id) VALUES (:n, :o) RETURNING id"),
+                {"n": pg_hierarchy.farm_name, "o": user_id},
+            ).scalar_one()
+            conn.execute(BUMP_HIERARCHY_SQL, {"uid": user_id})
+
+        async with Session() as db:
+            assert await ownership.owns_farm(db, user_id, new_farm)
+
+    try:
+        asyncio.run(main())
+    finally:
+        ownership.invalidate_ownership(user_id)
+        asyncio.run(engine.dispose())
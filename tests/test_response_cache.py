@@ -0,0 +1,41 @@
+# tests/test_response_cache.py
+"""
+GET /farms/ con la caché de respuestas contra Postgres (TEST_POSTGRES_URL).
+
+Un alta hecha por otro worker solo sube etag_versions (el tag de la caché
+local de este worker no se entera): ni el cuerpo ni la ETag pueden seguir
+siendo los de antes.
+"""
+from sqlalchemy import text
+
+from app.etags import BUMP_HIERARCHY_SQL
+from app.response_cache import response_cache
+
+
+def _hits() -> int:
+    return response_cache.stats.hits["farms"]
+
+
+def test_cached_farms_follow_etag_versions(pg_engine, pg_client, pg_hierarchy):
+    first = pg_client.get("/farms/")
+    assert first.status_code == 200
+    assert len(first.json()) == 1
+
+    hits = _hits()
+    again = pg_client.get("/farms/")
+    assert _hits() == hits + 1
+    assert again.content == first.content
+    assert pg_client.get("/farms/", headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+
+    # alta desde "otro worker": sube la versión pero no invalida el tag local
+    with pg_engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO farms (name, owner_user_id) VALUES (:n, :o)"),
+            {"n": pg_hierarchy.farm_name, "o": pg_hierarchy.user_id},
+        )
+        conn.execute(BUMP_HIERARCHY_SQL, {"uid": pg_hierarchy.user_id})
+
+    after = pg_client.get("/farms/", headers={"If-None-Match": first.headers["etag"]})
+    assert after.status_code == 200
+    assert len(after.json()) == 2
+    assert after.headers["etag"] != first.headers["etag"]
@@ -0,0 +1,83 @@
+# tests/test_telemetry_api.py
+"""
+Rutas de telemetría contra Postgres (TEST_POSTGRES_URL, base con
+`alembic -x telemetry_unique=true upgrade head`): ingesta por lotes con sus
+rechazos, ETag de la última lectura y límite por dispositivo de /by-shed.
+"""
+from datetime import datetime, timedelta, timezone
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def _batch(client, readings: list[dict]):
+    response = client.post("/telemetry/batch", json={"readings": readings})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_batch_rejects_foreign_invalid_and_duplicate_readings(pg_client, pg_hierarchy, pg_telemetry_unique):
+    ts = _now()
+    dk = pg_hierarchy.device_key
+    out = _batch(
+        pg_client,
+        [
+            {"device_key": dk, "ts_utc": ts.isoformat(), "temp": 20.5},
+            {"device_key": pg_hierarchy.orphan_key, "ts_utc": ts.isoformat()},  # no es suyo
+            {"device_key": dk, "ts_utc": "not-a-date"},
+            {"device_key": dk, "ts_utc": (ts - timedelta(days=3650)).isoformat()},  # sin partición
+            {"device_key": dk, "ts_utc": ts.isoformat(), "temp": 99.0},  # repetida en el lote
+            # sin zona = UTC
+            {"device_key": dk, "ts_utc": (ts + timedelta(seconds=1)).replace(tzinfo=None).isoformat()},
+        ],
+    )
+
+    assert out["received"] == 6
+    assert out["inserted"] == 2
+    assert [r["index"] for r in out["rejected"]] == [1, 2, 3, 4]
+    assert out["rejected"][3]["reason"].startswith("Duplicate reading")
+
+    # una lectura que ya entró en el lote anterior: ahora es repetida
+    again = _batch(pg_client, [{"device_key": dk, "ts_utc": ts.isoformat()}])
+    assert again["inserted"] == 0
+
+    rows = pg_client.get("/telemetry/", params={"device_key": dk}).json()
+    assert [(datetime.fromisoformat(r["ts_utc"]), r["temp"]) for r in rows] == [
+        (ts + timedelta(seconds=1), None),
+        (ts, 20.5),
+    ]
+
+
+def test_latest_etag_changes_with_new_readings(pg_client, pg_hierarchy):
+    dk = pg_hierarchy.device_key
+    assert pg_client.get(f"/telemetry/by-device-key/{dk}").status_code == 404
+
+    ts = _now()
+    _batch(pg_client, [{"device_key": dk, "ts_utc": ts.isoformat(), "temp": 20.0}])
+    first = pg_client.get(f"/telemetry/by-device-key/{dk}")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert pg_client.get(f"/telemetry/by-device-key/{dk}", headers={"If-None-Match": etag}).status_code == 304
+
+    _batch(pg_client, [{"device_key": dk, "ts_utc": (ts + timedelta(seconds=1)).isoformat(), "temp": 21.0}])
+    after = pg_client.get(f"/telemetry/by-device-key/{dk}", headers={"If-None-Match": etag})
+    assert after.status_code == 200
+    assert after.json()["temp"] == 21.0
+
+
+def test_by_shed_limit_is_per_device(pg_client, pg_hierarchy):
+    ts = _now()
+    quiet = f"test-quiet-{pg_hierarchy.tag}"
+    created = pg_client.post("/devices/", json={"device_key": quiet, "shed_id": pg_hierarchy.shed_id})
+    assert created.status_code == 200
+
+    _batch(
+        pg_client,
+        [{"device_key": pg_hierarchy.device_key, "ts_utc": (ts - timedelta(seconds=i)).isoformat()} for i in range(5)]
+        + [{"device_key": quiet, "ts_utc": (ts - timedelta(hours=1)).isoformat()}],
+    )
+    out = pg_client.get(f"/telemetry/by-shed/{pg_hierarchy.shed_id}", params={"limit": 2}).json()
+
+    assert {dk: len(rows) for dk, rows in out["devices"].items()} == {pg_hierarchy.device_key: 2, quiet: 1}
+    assert out["truncated"] == [pg_hierarchy.device_key]
@@ -0,0 +1,153 @@
+# tests/test_telemetry_store.py
+"""
+Escritura en bloque de telemetría (insert_readings) contra Postgres de verdad:
+necesita TEST_POSTGRES_URL apuntando a una base con
+`alembic -x telemetry_unique=true upgrade head` (sin el índice único no hay
+repetidas que saltar y el test de duplicados se salta).
+
+Varios lotes seguidos sobre la MISMA conexión (pool de 1), que es cuando las
+cachés del adaptador ya están calientes: lo que se cuenta como insertado
+tiene que estar en la tabla después del commit.
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import make_url, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import telemetry_store
+from app.telemetry_store import get_rows_for_keys, insert_readings
+
+PG_URL = os.environ.get("TEST_POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(not PG_URL, reason="TEST_POSTGRES_URL no definida")
+
+
+def _async_engine():
+    url = make_url(PG_URL).set(drivername="postgresql+asyncpg")
+    return create_async_engine(url, pool_size=1, max_overflow=0)
+
+
+def _reading(device_key: str, ts: datetime, temp: float) -> dict:
+    return {"device_key": device_key, "ts_utc": ts, "temp": temp, "hum": 60.0, "co2": 800, "nh3": 5}
+
+
+async def _count(session, device_key: str) -> int:
+    return (
+        await session.execute(text("SELECT count(*) FROM telemetry WHERE device_key = :dk"), {"dk": device_key})
+    ).scalar_one()
+
+
+async def _has_unique_index(session) -> bool:
+    return (
+        await session.execute(text("SELECT to_regclass('ux_telemetry_device_key_ts_utc') IS NOT NULL"))
+    ).scalar_one()
+
+
+async def _cleanup(engine, device_key: str) -> None:
+    async with engine.begin() as conn:
+        for table in ("telemetry", "telemetry_1h", "telemetry_1d"):
+            await conn.execute(text(f"DELETE FROM {table} WHERE device_key = :dk"), {"dk": device_key})
+
+
+async def _no_copy(db, rows) -> bool:
+    return False
+
+
+@pytest.mark.parametrize("copy", [True, False], ids=["copy", "executemany"])
+def test_insert_readings_skips_duplicates_and_commits(copy, monkeypatch):
+    if not copy:
+        monkeypatch.setattr(telemetry_store, "_copy_rows", _no_copy)
+    device_key = f"test-{uuid.uuid4().hex[:12]}"
+    ts = datetime.now(timezone.utc).replace(microsecond=0)
+
+    async def main():
+        engine = _async_engine()
+        Session = async_sessionmaker(engine, expire_on_commit=False)
+        results = []
+        try:
+            async with Session() as session:
+                if not await _has_unique_index(session):
+                    return None
+            # el 3º repite el 1º dentro del propio lote
+            batch = [_reading(device_key, ts, 20.0), _reading(device_key, ts + timedelta(seconds=1), 21.0),
+                     _reading(device_key, ts, 22.0)]
+            for _ in range(3):
+                async with Session() as session:
+                    results.append(await insert_readings(session, batch))
+                    await session.commit()
+            async with Session() as session:
+                results.append(await insert_readings(session, [_reading(device_key, ts + timedelta(seconds=2), 23.0)]))
+                await session.commit()
+            async with Session() as session:
+                stored = await _count(session, device_key)
+                stage = (await session.execute(text("SELECT to_regclass('pg_temp.telemetry_stage')"))).scalar()
+                staged = (await session.execute(text("SELECT count(*) FROM telemetry_stage"))).scalar() if stage else 0
+            return results, stored, staged
+        finally:
+            await _cleanup(engine, device_key)
+            await engine.dispose()
+
+    out = asyncio.run(main())
+    if out is None:
+        pytest.skip("sin ux_telemetry_device_key_ts_utc")
+    results, stored, staged = out
+
+    assert results == [(2, [2]), (0, [0, 1, 2]), (0, [0, 1, 2]), (1, [])]
+    assert stored == 3
+    assert staged == 0
+
+
+def test_insert_readings_rolls_back_with_the_session():
+    device_key = f"test-{uuid.uuid4().hex[:12]}"
+    ts = datetime.now(timezone.utc).replace(microsecond=0)
+
+    async def main():
+        engine = _async_engine()
+        Session = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            for _ in range(2):
+                async with Session() as session:
+                    await insert_readings(session, [_reading(device_key, ts, 20.0)])
+                    await session.rollback()
+            async with Session() as session:
+                return await _count(session, device_key)
+        finally:
+            await _cleanup(engine, device_key)
+            await engine.dispose()
+
+    assert asyncio.run(main()) == 0
+
+
+def test_rows_for_keys_limit_is_per_device():
+    busy, quiet = (f"test-{uuid.uuid4().hex[:12]}" for _ in range(2))
+    ts = datetime.now(timezone.utc).replace(microsecond=0)
+
+    async def main():
+        engine = _async_engine()
+        Session = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            async with Session() as session:
+                await insert_readings(
+                    session,
+                    [_reading(busy, ts - timedelta(seconds=i), 20.0) for i in range(5)]
+                    + [_reading(quiet, ts - timedelta(hours=1), 21.0)],
+                )
+                await session.commit()
+            async with Session() as session:
+                return await get_rows_for_keys(session, [busy, quiet], ts - timedelta(days=1), ts, limit=2)
+        finally:
+            for dk in (busy, quiet):
+                await _cleanup(engine, dk)
+            await engine.dispose()
+
+    rows, truncated = asyncio.run(main())
+
+    assert [(r.device_key, r.ts_utc) for r in rows if r.device_key == busy] == [
+        (busy, ts), (busy, ts - timedelta(seconds=1))
+    ]
+    assert [r.device_key for r in rows if r.device_key == quiet] == [quiet]
+    assert truncated == {busy}